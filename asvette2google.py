@@ -5,34 +5,73 @@ I lva ensuite récupérer la liste des sorties présentes dans le calendrier Goo
 En fonction des résultats :
 - On ajoute les sorties de l'activité ASVETTE qui n'existent pas sur Google Calendar.
 - On met à jour les sorties de l'activité ASVETTE qui ont changé.
+
+Les modules lourds (BeautifulSoup, lxml, googleapiclient.discovery, google_auth_oauthlib)
+ne sont importés qu'à leur première utilisation.
 """
 import argparse
+import collections
+import contextlib
+import cProfile
+import csv
+import dataclasses
+import hashlib
+import html
+import importlib.util
+import json
 import os
+import pstats
+import random
+import re
+import signal
+import socket
+import sqlite3
 import sys
+import threading
 import time
+import tracemalloc
+from typing import Callable
 
 import requests
-import pandas as pd
 import datetime
 import httplib2
 import urllib.parse
-from ast import literal_eval
-from bs4 import BeautifulSoup
+from concurrent.futures import Future, ThreadPoolExecutor
 from google.auth.exceptions import RefreshError
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
-from icecream import ic
 import logging
 
-ic.configureOutput(includeContext=True)
-
 SCRIPT_PATH = os.path.dirname(os.path.abspath(__file__))
 
 SCOPES: list[str] = ["https://www.googleapis.com/auth/calendar"]
 TOKEN: str = os.path.join(SCRIPT_PATH, "token.json")
+CREDENTIALS: str = os.path.join(SCRIPT_PATH, "credentials.json")
+PAGE_CACHE: str = os.path.join(SCRIPT_PATH, "asvette_cache.json")
+GOOGLE_SYNC: str = os.path.join(SCRIPT_PATH, "google_sync.json")
+STATE_DB: str = os.path.join(SCRIPT_PATH, "asvette_state.db")
+# Baux des calendriers en cours de synchronisation, partagés par les exécutions concurrentes
+LEASE_DB: str = os.path.join(SCRIPT_PATH, "asvette_leases.db")
+# Fichiers d'état des exécutions sur des URLs de substitution (émulateur), un sous-dossier par jeu d'URLs
+OVERRIDE_DATA_DIR: str = os.path.join(SCRIPT_PATH, "asvette_test")
+# Copie locale du document de découverte de l'API Google Calendar v3
+DISCOVERY_CACHE: str = os.path.join(SCRIPT_PATH, "calendar_v3_discovery.json")
+# Flux iCalendar / CSV (--feed) : empreinte de chaque flux, par calendrier Google
+FEED_MANIFEST: str = "feeds.json"
+# Colonnes du fichier CSV d'import dans Google Agenda
+CSV_COLUMNS: list[str] = ['Subject', 'Start Date', 'Start Time', 'End Date', 'End Time', 'All Day Event',
+                          'Description', 'Location', 'Private']
+ICS_TIMEZONE: list[str] = [
+    'BEGIN:VTIMEZONE', 'TZID:Europe/Paris',
+    'BEGIN:DAYLIGHT', 'TZOFFSETFROM:+0100', 'TZOFFSETTO:+0200', 'TZNAME:CEST',
+    'DTSTART:19700329T020000', 'RRULE:FREQ=YEARLY;BYMONTH=3;BYDAY=-1SU', 'END:DAYLIGHT',
+    'BEGIN:STANDARD', 'TZOFFSETFROM:+0200', 'TZOFFSETTO:+0100', 'TZNAME:CET',
+    'DTSTART:19701025T030000', 'RRULE:FREQ=YEARLY;BYMONTH=10;BYDAY=-1SU', 'END:STANDARD',
+    'END:VTIMEZONE',
+]
+# Rapport JSON de la dernière synchronisation (durées des phases et compteurs)
+RUN_REPORT: str = os.path.join(SCRIPT_PATH, "asvette_report.json")
 
 URL: str = "https://asvel.limoog.net/public/pages/liste-sortie.php?Pass%C3%A9es=F&Activite="
 URL_SORTIE_BASE: str = "https://asvette.limoog.net/public/pages/info-sortie.php?id="
@@ -54,17 +93,91 @@ ACTIVITIES: dict[str, dict] = {
     'Escalade': {'asvette_id': 9, 'google_id': ESC},
     'Ski de randonnée nordique': {'asvette_id': 10, 'google_id': SDF},
 }
-ED_str: str = 'End Date'
-SD_str: str = 'Start Date'
-ST_str: str = 'Start Time'
-ET_str: str = 'End Time'
-ADE_str: str = 'All Day Event'
+# Listing des événements Google : taille de page maximale et champs lus par _get_event_row.
+LIST_PAGE_SIZE: int = 2500
+# Listing léger : Id et empreinte seulement. Les événements du script sans empreinte
+# (créés avant son introduction) sont ensuite relus un à un (events.get).
+LIST_FIELDS: str = 'nextPageToken,items(id,etag,extendedProperties/private)'
+SYNC_FIELDS: str = ('nextPageToken,nextSyncToken,items(id,etag,status,summary,description,location,'
+                    'start,end,extendedProperties/private)')
+# Début de l'Id des événements Google créés par le script (suivi de l'id d'activité ASVETTE)
+EVENT_ID_PREFIX: str = 'asvetteact'
+# Empreinte du contenu stockée dans extendedProperties.private de chaque événement
+HASH_KEY: str = 'asvetteHash'
+HASH_SCHEMA_KEY: str = 'asvetteSchema'
+HASH_SCHEMA: str = '1'
+# Champs de l'API à envoyer (PATCH) quand un champ d'une sortie (Sortie) a changé.
+# Si l'empreinte diffère et que l'événement n'a pas pu être relu, tous les champs du contenu sont envoyés.
+PATCH_FIELDS: dict[str, tuple[str, ...]] = {
+    'subject': ('summary',),
+    'location': ('location',),
+    'description': ('description',),
+    'start_date': ('start',),
+    'start_time': ('start',),
+    'end_date': ('end',),
+    'end_time': ('end',),
+    'all_day': ('start', 'end'),
+    'url': ('source',),
+    'content_hash': ('summary', 'location', 'description', 'start', 'end', 'source'),
+}
+# Quota de l'API Google Calendar (requêtes par seconde et par utilisateur) et reprises sur erreur
+API_RATE: float = 10.0
+API_BURST: int = 10
+MAX_RETRIES: int = 5
+BACKOFF_BASE: float = 1.0
+BACKOFF_MAX: float = 64.0
+RATE_LIMIT_REASONS: tuple[str, ...] = ('rateLimitExceeded', 'userRateLimitExceeded', 'quotaExceeded')
+# Nombre de pages ASVETTE téléchargées en parallèle, et de calendriers Google traités en parallèle
+FETCH_WORKERS: int = 4
+CALENDAR_WORKERS: int = 4
+# Mode démon : intervalle de scrutation d'une activité (secondes), raccourci après un changement
+POLL_MIN: int = 5 * 60
+POLL_MAX: int = 60 * 60
+# Mode --profile : nombre de fonctions (et de lignes d'allocation) listées dans les résumés
+PROFILE_TOP: int = 40
+# Nombre maximal de requêtes par lot (limite de l'API batch de Google Calendar).
+BATCH_SIZE: int = 50
+# Durée d'un bail sans battement de cœur (secondes), et nombre de battements par durée de bail
+LEASE_TTL: int = 5 * 60
+LEASE_HEARTBEATS: int = 5
+# Enrichissement (--enrich) par les pages info-sortie.php : cache par sortie, durée de validité
+# d'une page (secondes), nombre maximal de pages en cache et de téléchargements simultanés
+DETAIL_CACHE: str = os.path.join(SCRIPT_PATH, "asvette_details.json")
+DETAIL_TTL: int = 6 * 60 * 60
+DETAIL_CACHE_SIZE: int = 20000
+DETAIL_WORKERS: int = 8
+# Libellés des champs d'une page info-sortie.php (début du libellé, en minuscules)
+DETAIL_LABELS: dict[str, tuple[str, ...]] = {
+    'meeting_point': ('lieu de rendez-vous', 'point de rendez-vous', 'rendez-vous', 'rdv'),
+    'start_time': ('heure de rendez-vous', 'heure de départ', 'départ'),
+    'end_time': ('heure de retour', 'heure de fin', 'retour'),
+    'places_left': ('places restantes', 'places disponibles', 'places libres'),
+    'registration': ('état des inscriptions', 'inscriptions', 'inscription'),
+}
+
+
+# Club (--config) pour lequel travaille chaque thread, ajouté aux lignes du journal
+_LOG_TENANT: threading.local = threading.local()
+
+
+class TenantLogFilter(logging.Filter):
+    """
+    Ajoute aux lignes du journal le club pour lequel travaille le thread : les threads des pools
+    partagés (FairPool) servent tous les clubs à tour de rôle.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        tenant: str | None = getattr(_LOG_TENANT, 'name', None)
+        record.tenant = '' if tenant is None else f'[{tenant}] '
+        return True
 
 
 def start_logging(log_file_path: str):
     # Set up logging
     logging.basicConfig(filename=log_file_path, level=logging.INFO,
-                        format='%(asctime)s - %(levelname)s - %(message)s')
+                        format='%(asctime)s - %(levelname)s - %(tenant)s%(message)s')
+    for handler in logging.getLogger().handlers:
+        handler.addFilter(TenantLogFilter())
 
 
 class Zap:
@@ -94,6 +207,133 @@ class Zap:
         self.payload['result'] += result
 
 
+def get_zapier_hook(url: str) -> str | None:
+    """
+    Retourne l'URL du webhook Zapier, ou None si l'URL n'est pas celle d'un webhook Zapier.
+    """
+    try:
+        parsed_url = urllib.parse.urlparse(url)
+
+        if parsed_url.scheme == 'https' and parsed_url.netloc == 'hooks.zapier.com':
+            return "https://hooks.zapier.com" + parsed_url.path
+    except ValueError:
+        return None
+
+
+@dataclasses.dataclass(frozen=True)
+class Tenant:
+    """
+    Un club (ou une section) déclaré dans le fichier de configuration (--config) : ses URLs
+    ASVETTE, ses activités et leurs calendriers Google, ses credentials et son quota d'API.
+    Ses fichiers (token, caches, état local, rapport) sont rangés dans data_dir.
+    """
+    name: str
+    # Activités et id ASVETTE / Google correspondants, au format de ACTIVITIES
+    activities: dict[str, dict]
+    data_dir: str
+    token: str
+    credentials: str
+    url: str = URL
+    url_sortie_base: str = URL_SORTIE_BASE
+    webhook: str | None = None
+    api_rate: float = API_RATE
+    api_burst: int = API_BURST
+
+
+def load_tenants(path: str) -> tuple[list[Tenant], dict]:
+    """
+    Lit le fichier de configuration des clubs (JSON) :
+    {"fetch_workers": 8, "calendar_workers": 8,
+     "tenants": [{"name": "asvel", "activities": {"Escalade": {"asvette_id": 9, "google_id": "..."}},
+                  "url": "...", "url_sortie_base": "...", "data_dir": "asvel", "token": "...",
+                  "credentials": "...", "hook": "...", "api_rate": 10, "api_burst": 10}]}
+    Seuls name et activities sont obligatoires. Les chemins relatifs partent du dossier du fichier ;
+    data_dir vaut par défaut le nom du club, token et credentials sont par défaut dans data_dir.
+
+    :return: Les clubs, et les tailles des pools partagés {'fetch_workers', 'calendar_workers'}
+    :raise ValueError: Si la configuration est invalide
+    """
+    with open(path) as config_file:
+        config: dict = json.load(config_file)
+    if not isinstance(config, dict):
+        raise ValueError("La configuration doit être un objet JSON")
+    root: str = os.path.dirname(os.path.abspath(path))
+    tenants: list[Tenant] = []
+    for entry in config.get('tenants', []):
+        if not isinstance(entry, dict):
+            raise ValueError(f"Club invalide: {entry!r}")
+        name: str = entry.get('name', '')
+        if not name or name in [tenant.name for tenant in tenants]:
+            raise ValueError(f"Nom de club absent ou en double: {name!r}")
+        activities: dict[str, dict] = entry.get('activities', {})
+        if not isinstance(activities, dict) or not activities or not all(
+                isinstance(activity, dict) and isinstance(activity.get('asvette_id'), int)
+                and isinstance(activity.get('google_id'), str) for activity in activities.values()):
+            raise ValueError(f"{name}: chaque activité doit avoir un asvette_id et un google_id")
+        data_dir: str = os.path.join(root, entry.get('data_dir', name))
+        tenants.append(Tenant(
+            name=name,
+            activities=activities,
+            data_dir=data_dir,
+            token=os.path.join(root, entry['token']) if 'token' in entry else os.path.join(data_dir, 'token.json'),
+            credentials=(os.path.join(root, entry['credentials']) if 'credentials' in entry
+                         else os.path.join(data_dir, 'credentials.json')),
+            url=entry.get('url', URL),
+            url_sortie_base=entry.get('url_sortie_base', URL_SORTIE_BASE),
+            webhook=None if entry.get('hook') is None else get_zapier_hook(entry['hook']),
+            api_rate=float(entry.get('api_rate', API_RATE)),
+            api_burst=int(entry.get('api_burst', API_BURST)),
+        ))
+    if not tenants:
+        raise ValueError("Aucun club déclaré")
+    workers: dict = {'fetch_workers': int(config.get('fetch_workers', FETCH_WORKERS)),
+                     'calendar_workers': int(config.get('calendar_workers', CALENDAR_WORKERS))}
+    return tenants, workers
+
+
+def get_data_dir(data_dir: str | None, asvette_url: str, sortie_url: str, google_api_url: str | None) -> str | None:
+    """
+    Retourne le dossier des fichiers d'état (caches, état local, baux) : celui de --data-dir,
+    ou, si une URL de substitution est utilisée (émulateur), un sous-dossier de OVERRIDE_DATA_DIR
+    propre à ces URLs, pour ne jamais mélanger état de test et de production.
+    :return: Le dossier, ou None pour les fichiers par défaut (dossier du script, dossiers des clubs)
+    """
+    if data_dir is not None:
+        return os.path.abspath(data_dir)
+    if asvette_url == URL and sortie_url == URL_SORTIE_BASE and google_api_url is None:
+        return None
+    urls: str = '\n'.join([asvette_url, sortie_url, google_api_url or ''])
+    return os.path.join(OVERRIDE_DATA_DIR, hashlib.sha256(urls.encode()).hexdigest()[:12])
+
+
+def parse_shard(value: str) -> tuple[int, int]:
+    """
+    Lit l'option --shard : 'I/N', avec 1 <= I <= N.
+    """
+    try:
+        index, count = (int(part) for part in value.split('/'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"{value!r} n'est pas de la forme I/N")
+    if not 1 <= index <= count:
+        raise argparse.ArgumentTypeError(f"{value!r} : il faut 1 <= I <= N")
+    return index, count
+
+
+def get_shard(activities: dict[str, dict], shard: tuple[int, int] | None) -> list[str]:
+    """
+    Retourne les activités d'une part (--shard) : les calendriers Google sont répartis entre
+    les parts à tour de rôle, dans l'ordre de leur première activité. Les activités d'un même
+    calendrier sont donc toujours dans la même part.
+    :param shard: (I, N), ou None pour toutes les activités
+    """
+    if shard is None:
+        return list(activities)
+    index, count = shard
+    calendar_ids: list[str] = list(dict.fromkeys(activity['google_id'] for activity in activities.values()))
+    selected: set[str] = set(calendar_ids[index - 1::count])
+    return [name for name, activity in activities.items() if activity['google_id'] in selected]
+
+
 class CommandLineArguments:
 
     def __init__(self):
@@ -102,279 +342,1837 @@ class CommandLineArguments:
                             help="Chemin absolu vers le fichier de logs (défaut : asvette.log)")
         parser.add_argument('--hook', type=str, default=None,
                             help="URL d'un webhook Zapier qui capturera le résultat de l'automatisation.")
+        parser.add_argument('--no-cache', action='store_true',
+                            help="Ignore le cache des pages ASVETTE et synchronise toutes les activités.")
+        parser.add_argument('--incremental', action='store_true',
+                            help="Ne lit sur Google que les événements modifiés depuis la dernière exécution.")
+        parser.add_argument('--daemon', action='store_true',
+                            help="Reste actif et scrute chaque activité à intervalle adaptatif (arrêt par SIGTERM).")
+        parser.add_argument('--startup-report', action='store_true',
+                            help="Affiche la durée de l'initialisation (imports : python -X importtime).")
+        parser.add_argument('--report', type=str, default=None,
+                            help="Chemin du rapport JSON de la synchronisation "
+                                 "(défaut : asvette_report.json du dossier des fichiers d'état)")
+        parser.add_argument('--prom', type=str, default=None,
+                            help="Chemin d'un fichier texte Prometheus (textfile collector) où exporter les mesures.")
+        parser.add_argument('--asvette-url', type=str, default=URL,
+                            help="URL des listes de sorties ASVETTE, sans l'id d'activité (ex. : émulateur local).")
+        parser.add_argument('--asvette-sortie-url', type=str, default=URL_SORTIE_BASE,
+                            help="URL des pages des sorties ASVETTE, sans l'id de la sortie (ex. : émulateur local).")
+        parser.add_argument('--enrich', action='store_true',
+                            help="Complète les sorties avec leur page ASVETTE (rendez-vous, horaires, places, "
+                                 "inscriptions), mise en cache.")
+        parser.add_argument('--google-api-url', type=str, default=None,
+                            help="Racine d'une API Google Calendar de substitution (ex. : http://127.0.0.1:8765/), "
+                                 "utilisée sans authentification.")
+        parser.add_argument('--feed', type=str, default=None, metavar='DIR',
+                            help="Écrit un flux iCalendar par calendrier Google dans ce dossier, au lieu "
+                                 "d'écrire dans les calendriers par l'API.")
+        parser.add_argument('--feed-csv', action='store_true',
+                            help="Avec --feed : écrit aussi un fichier CSV à importer dans Google Agenda.")
+        parser.add_argument('--activity', action='append', choices=list(ACTIVITIES), default=None,
+                            help="Ne synchronise que cette activité (option répétable).")
+        parser.add_argument('--profile', type=str, default=None, metavar='DIR',
+                            help="Profile la synchronisation (cProfile) et écrit les résultats dans ce dossier.")
+        parser.add_argument('--profile-memory', action='store_true',
+                            help="Avec --profile : suit aussi les allocations mémoire (tracemalloc).")
+        parser.add_argument('--profile-top', type=int, default=PROFILE_TOP,
+                            help=f"Avec --profile : nombre de lignes des résumés (défaut : {PROFILE_TOP})")
+        parser.add_argument('--shard', type=parse_shard, default=None, metavar='I/N',
+                            help="Ne synchronise que la part I (de 1 à N) des calendriers Google, pour répartir "
+                                 "les calendriers entre plusieurs exécutions.")
+        parser.add_argument('--lease-db', type=str, default=None,
+                            help="Base SQLite des baux des calendriers, partagée par les exécutions concurrentes "
+                                 "(défaut : asvette_leases.db du dossier des fichiers d'état)")
+        parser.add_argument('--data-dir', type=str, default=None, metavar='DIR',
+                            help="Dossier des fichiers d'état (caches, état local, baux). Par défaut le dossier "
+                                 "du script, ou un sous-dossier de asvette_test propre aux URLs de substitution "
+                                 "(--asvette-url, --asvette-sortie-url, --google-api-url).")
+        parser.add_argument('--config', type=str, default=None, metavar='FILE',
+                            help="Fichier JSON déclarant plusieurs clubs, synchronisés par un seul processus.")
         self.arguments = parser.parse_args()
+        if self.arguments.feed is not None and self.arguments.daemon:
+            parser.error("--feed ne peut pas être utilisé avec --daemon")
+        if self.arguments.config is not None and (self.arguments.daemon or self.arguments.feed is not None
+                                                  or self.arguments.activity is not None):
+            parser.error("--config ne peut pas être utilisé avec --daemon, --feed ou --activity")
+        self.tenants: list[Tenant] | None = None
+        self.workers: dict = {'fetch_workers': FETCH_WORKERS, 'calendar_workers': CALENDAR_WORKERS}
+        if self.arguments.config is not None:
+            try:
+                self.tenants, self.workers = load_tenants(self.arguments.config)
+            except (OSError, ValueError, KeyError, TypeError) as error:
+                parser.error(f"Configuration {self.arguments.config} invalide: {error}")
         self.log_file: str = os.path.abspath(self.arguments.log)
-        self.webhook: str | None = None if self.arguments.hook is None else self._get_zapier_hook()
+        self.use_cache: bool = not self.arguments.no_cache
+        self.incremental: bool = self.arguments.incremental
+        self.daemon: bool = self.arguments.daemon
+        self.startup_report: bool = self.arguments.startup_report
+        self.prom_file: str | None = None if self.arguments.prom is None else os.path.abspath(self.arguments.prom)
+        self.asvette_url: str = self.arguments.asvette_url
+        self.asvette_sortie_url: str = self.arguments.asvette_sortie_url
+        self.enrich: bool = self.arguments.enrich
+        self.feed_dir: str | None = None if self.arguments.feed is None else os.path.abspath(self.arguments.feed)
+        self.feed_csv: bool = self.arguments.feed_csv
+        self.google_api_url: str | None = self.arguments.google_api_url
+        self.shard: tuple[int, int] | None = self.arguments.shard
+        # None : fichiers d'état par défaut (dossier du script, ou dossiers des clubs avec --config)
+        self.data_dir: str | None = get_data_dir(self.arguments.data_dir, self.asvette_url, self.asvette_sortie_url,
+                                                 self.google_api_url)
+        if self.data_dir is not None:
+            os.makedirs(self.data_dir, exist_ok=True)
+        self.lease_db: str = (self.get_path(os.path.basename(LEASE_DB)) if self.arguments.lease_db is None
+                              else os.path.abspath(self.arguments.lease_db))
+        self.report_file: str = (self.get_path(os.path.basename(RUN_REPORT)) if self.arguments.report is None
+                                 else os.path.abspath(self.arguments.report))
+        self.activities: list[str] = [activity for activity in get_shard(ACTIVITIES, self.shard)
+                                      if self.arguments.activity is None or activity in self.arguments.activity]
+        self.profile_dir: str | None = (None if self.arguments.profile is None
+                                        else os.path.abspath(self.arguments.profile))
+        self.profile_memory: bool = self.arguments.profile_memory
+        self.profile_top: int = self.arguments.profile_top
+        self.webhook: str | None = None if self.arguments.hook is None else get_zapier_hook(self.arguments.hook)
+
+    def get_path(self, file_name: str) -> str:
+        """
+        Retourne le chemin d'un fichier d'état dans le dossier des fichiers d'état.
+        """
+        return os.path.join(SCRIPT_PATH if self.data_dir is None else self.data_dir, file_name)
+
+
+class SyncStore:
+    """
+    Stockage sur disque, par calendrier Google, du jeton de synchronisation (nextSyncToken)
+    et de la copie locale des événements, pour la synchronisation incrémentale.
+    """
+
+    def __init__(self, path: str):
+        self.path: str = path
+        self.calendars: dict[str, dict] = {}
+        if os.path.exists(path):
+            try:
+                with open(path) as sync_file:
+                    self.calendars = json.load(sync_file)
+            except (OSError, ValueError) as error:
+                logging.warning(f"Fichier {path} illisible, listing complet: {error}")
+
+    def get(self, calendar_id: str) -> dict:
+        return self.calendars.get(calendar_id, {})
+
+    def set(self, calendar_id: str, sync_token: str | None, events: dict[str, dict]) -> None:
+        self.calendars[calendar_id] = {'sync_token': sync_token, 'events': events}
+
+    def save(self) -> None:
+        with open(self.path, 'w') as sync_file:
+            json.dump(self.calendars, sync_file)
+
+
+def get_digest(event: dict) -> str:
+    """
+    Retourne l'empreinte (SHA-256) du corps d'un événement tel qu'envoyé à Google.
+    """
+    return hashlib.sha256(json.dumps(event, sort_keys=True).encode()).hexdigest()
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class Sortie:
+    """
+    Une sortie ASVETTE, mise en forme pour le calendrier Google.
+    Les dates sont au format 'YYYY-MM-DD', les heures au format 'HH:MM:SS' (vides si journée entière).
+    """
+    id: str
+    subject: str
+    start_date: str
+    start_time: str
+    end_date: str
+    end_time: str
+    all_day: bool
+    description: str
+    location: str
+    # Page de la sortie sur ASVETTE (info-sortie.php)
+    url: str
+
+    def to_event(self) -> dict:
+        """
+        Retourne la sortie au format de l'API Google Calendar, avec son empreinte.
+        https://developers.google.com/calendar/api/v3/reference/events/insert
+        """
+        if self.all_day:
+            start: dict = {'date': self.start_date, 'timeZone': 'Europe/Paris'}
+            end: dict = {'date': self.end_date, 'timeZone': 'Europe/Paris'}
+        else:
+            start = {'dateTime': f'{self.start_date}T{self.start_time}', 'timeZone': 'Europe/Paris'}
+            end = {'dateTime': f'{self.end_date}T{self.end_time}', 'timeZone': 'Europe/Paris'}
+        event: dict = {
+            'id': self.id,
+            'summary': self.subject,
+            'location': self.location,
+            'description': self.description,
+            'start': start,
+            'end': end,
+            'source': {'title': 'ASVETTE', 'url': self.url},
+        }
+        # Empreinte du contenu : une seule comparaison suffit à détecter un changement
+        event['extendedProperties'] = {'private': {HASH_KEY: get_digest(event), HASH_SCHEMA_KEY: HASH_SCHEMA}}
+        return event
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class CalendarEvent(Sortie):
+    """
+    Un événement Google Calendar ramené au format d'une sortie, avec l'empreinte
+    stockée dans extendedProperties (vide si l'événement n'en a pas).
+    """
+    content_hash: str = ''
+
+
+# Champs comparés entre une sortie ASVETTE et l'événement Google correspondant
+SORTIE_FIELDS: tuple[str, ...] = tuple(field.name for field in dataclasses.fields(Sortie))
+
+
+class StateStore:
+    """
+    État local des sorties synchronisées (base SQLite) : pour chaque Id, le calendrier,
+    l'empreinte du dernier corps envoyé, l'etag Google et la date de synchronisation.
+    Si trusted est vrai, les sorties dont l'empreinte n'a pas changé ne sont pas vérifiées
+    sur Google. La connexion est partagée entre les threads, protégée par un verrou.
+    """
+
+    def __init__(self, path: str, trusted: bool = True):
+        self.trusted: bool = trusted
+        self.lock: threading.Lock = threading.Lock()
+        self.connection: sqlite3.Connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS events ("
+            "id TEXT PRIMARY KEY, calendar_id TEXT NOT NULL, digest TEXT NOT NULL, "
+            "etag TEXT, synced_at TEXT NOT NULL)")
+
+    def get_digests(self, calendar_id: str) -> dict[str, str]:
+        """
+        Retourne les empreintes connues des sorties d'un calendrier, par Id.
+        """
+        if not self.trusted:
+            return {}
+        with self.lock:
+            rows = self.connection.execute("SELECT id, digest FROM events WHERE calendar_id = ?",
+                                           (calendar_id,))
+            return dict(rows.fetchall())
+
+    def record(self, calendar_id: str, event: dict, etag: str | None) -> None:
+        """
+        Enregistre une sortie synchronisée.
+        :param calendar_id: Id du calendrier Google
+        :param event: Corps de l'événement tel qu'envoyé à Google (Sortie.to_event)
+        :param etag: Etag Google de l'événement
+        """
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO events (id, calendar_id, digest, etag, synced_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (event['id'], calendar_id, get_digest(event), etag,
+                 datetime.datetime.now().isoformat(timespec='seconds')))
+
+    def get_summary(self) -> list[tuple[str, int, str]]:
+        """
+        Retourne, pour chaque calendrier, le nombre de sorties synchronisées
+        et la date de la dernière synchronisation.
+        """
+        with self.lock:
+            return self.connection.execute(
+                "SELECT calendar_id, COUNT(*), MAX(synced_at) FROM events GROUP BY calendar_id").fetchall()
+
+    def commit(self) -> None:
+        with self.lock:
+            self.connection.commit()
+
+    def close(self) -> None:
+        with self.lock:
+            self.connection.commit()
+            self.connection.close()
+
+
+class Lease:
+    """
+    Bail sur des calendriers Google, enregistré dans une base SQLite partagée par les exécutions
+    concurrentes (tâches cron qui se chevauchent, ou plusieurs hôtes si la base est sur un disque
+    partagé). Tant que le bail est tenu, un thread le prolonge (battement de cœur) ; le bail d'un
+    processus arrêté brutalement expire après ttl secondes et peut être repris.
+    """
 
-    def _get_zapier_hook(self) -> str | None:
+    def __init__(self, path: str, calendar_ids: list[str], ttl: int = LEASE_TTL):
+        self.path: str = path
+        self.calendar_ids: list[str] = sorted(set(calendar_ids))
+        self.ttl: int = ttl
+        self.owner: str = f'{socket.gethostname()}:{os.getpid()}:{os.urandom(4).hex()}'
+        # Détenteur du bail d'un des calendriers, si acquire() a échoué
+        self.holder: str | None = None
+        # Vrai si le bail a été repris par une autre exécution (battements de cœur interrompus)
+        self.is_lost: bool = False
+        self.stop: threading.Event = threading.Event()
+        self.heartbeat: threading.Thread | None = None
+
+    def _connect(self) -> sqlite3.Connection:
+        # Transactions explicites (BEGIN IMMEDIATE) : une seule exécution prend le bail
+        connection: sqlite3.Connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        connection.execute('CREATE TABLE IF NOT EXISTS leases (calendar_id TEXT PRIMARY KEY, '
+                           'owner TEXT NOT NULL, expires_at REAL NOT NULL)')
+        return connection
+
+    def acquire(self) -> bool:
+        """
+        Prend le bail de tous les calendriers, ou d'aucun si l'un d'eux est déjà tenu.
+        :return: Vrai si le bail est obtenu
+        """
+        placeholders: str = ','.join('?' * len(self.calendar_ids))
+        connection: sqlite3.Connection = self._connect()
         try:
-            parsed_url = urllib.parse.urlparse(self.arguments.hook)
+            connection.execute('BEGIN IMMEDIATE')
+            now: float = time.time()
+            row: tuple | None = connection.execute(
+                f'SELECT owner FROM leases WHERE calendar_id IN ({placeholders}) AND expires_at > ? AND owner != ?',
+                (*self.calendar_ids, now, self.owner)).fetchone()
+            if row is not None:
+                connection.execute('ROLLBACK')
+                self.holder = row[0]
+                return False
+            connection.executemany('INSERT OR REPLACE INTO leases VALUES (?, ?, ?)',
+                                   [(calendar_id, self.owner, now + self.ttl) for calendar_id in self.calendar_ids])
+            connection.execute('COMMIT')
+        finally:
+            connection.close()
+        self.heartbeat = threading.Thread(target=self._beat, name='lease', daemon=True)
+        self.heartbeat.start()
+        return True
+
+    def _beat(self) -> None:
+        placeholders: str = ','.join('?' * len(self.calendar_ids))
+        while not self.stop.wait(self.ttl / LEASE_HEARTBEATS):
+            try:
+                connection: sqlite3.Connection = self._connect()
+                try:
+                    renewed: int = connection.execute(
+                        f'UPDATE leases SET expires_at = ? WHERE calendar_id IN ({placeholders}) AND owner = ?',
+                        (time.time() + self.ttl, *self.calendar_ids, self.owner)).rowcount
+                finally:
+                    connection.close()
+            except sqlite3.Error as error:
+                logging.warning(f"Le bail n'a pas pu être prolongé: {error}")
+                continue
+            if renewed < len(self.calendar_ids):
+                self.is_lost = True
+                logging.error("Le bail des calendriers a été repris par une autre exécution")
+                return
+
+    def release(self) -> None:
+        """
+        Arrête les battements de cœur et rend le bail.
+        """
+        self.stop.set()
+        if self.heartbeat is None:
+            return
+        self.heartbeat.join()
+        connection: sqlite3.Connection = self._connect()
+        try:
+            connection.execute('DELETE FROM leases WHERE owner = ?', (self.owner,))
+        finally:
+            connection.close()
 
-            if parsed_url.scheme == 'https' and parsed_url.netloc == 'hooks.zapier.com':
-                return "https://hooks.zapier.com" + parsed_url.path
-        except ValueError:
-            return None
+
+def get_patch(event: dict, columns: tuple[str, ...]) -> dict:
+    """
+    Retourne le corps d'une requête PATCH ne contenant que les champs modifiés d'un événement.
+    L'empreinte (extendedProperties) est toujours envoyée.
+    :param event: Événement complet au format de l'API (Sortie.to_event)
+    :param columns: Champs de la sortie modifiés
+    :return: Le corps de la requête PATCH
+    """
+    keys: set[str] = {key for column in columns for key in PATCH_FIELDS.get(column, ())}
+    patch: dict = {key: dict(event[key]) if isinstance(event[key], dict) else event[key]
+                   for key in sorted(keys)}
+    # Passage journée entière <-> horaire : on efface explicitement l'ancien champ
+    for key in ('start', 'end'):
+        if key in patch:
+            patch[key].setdefault('date', None)
+            patch[key].setdefault('dateTime', None)
+    patch['extendedProperties'] = event['extendedProperties']
+    return patch
+
+
+# Erreurs des appels à l'API Google : reprises par l'ordonnanceur si elles sont transitoires,
+# puis propagées à l'appelant une fois les reprises épuisées
+API_ERRORS: tuple[type[Exception], ...] = (HttpError, httplib2.error.ServerNotFoundError, TimeoutError,
+                                           ConnectionError)
+
+
+class ApiScheduler:
+    """
+    Point de passage de tous les appels à l'API Google Calendar.
+    Un seau à jetons limite le débit au quota par utilisateur, et les erreurs de quota
+    ou transitoires (403 rateLimitExceeded, 429, 5xx, réseau) sont reprises avec un
+    délai exponentiel aléatoire. Partagé entre les threads.
+    """
+
+    def __init__(self, rate: float = API_RATE, burst: int = API_BURST, max_retries: int = MAX_RETRIES):
+        self.rate: float = rate
+        self.burst: int = burst
+        self.max_retries: int = max_retries
+        self.lock: threading.Lock = threading.Lock()
+        self.tokens: float = burst
+        self.updated: float = time.monotonic()
+        # Compteurs de l'exécution
+        self.nb_calls: int = 0
+        self.nb_retries: int = 0
+        self.nb_throttled: int = 0
+
+    @staticmethod
+    def is_retriable(error: Exception) -> bool:
+        """
+        Indique si l'erreur est liée au quota ou transitoire, et peut donc être reprise.
+        """
+        if isinstance(error, HttpError):
+            if error.resp.status in (429, 500, 502, 503, 504):
+                return True
+            if error.resp.status == 403:
+                details: list = error.error_details if isinstance(error.error_details, list) else []
+                return any(isinstance(detail, dict) and detail.get('reason') in RATE_LIMIT_REASONS
+                           for detail in details)
+            return False
+        return isinstance(error, (httplib2.error.ServerNotFoundError, TimeoutError, ConnectionError))
+
+    def acquire(self, cost: int = 1) -> None:
+        """
+        Attend que le seau contienne assez de jetons pour cost requêtes.
+        """
+        with self.lock:
+            self.nb_calls += cost
+            now: float = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= cost
+            wait: float = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            if wait > 0:
+                self.nb_throttled += 1
+        if wait > 0:
+            time.sleep(wait)
+
+    def backoff(self, attempt: int) -> None:
+        """
+        Attend avant la reprise numéro attempt (délai exponentiel, avec gigue).
+        """
+        with self.lock:
+            self.nb_retries += 1
+        time.sleep(random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt)))
+
+    def execute(self, request, cost: int = 1):
+        """
+        Exécute une requête (ou un batch de cost requêtes) en respectant le quota,
+        avec reprises sur les erreurs de quota ou transitoires.
+        """
+        attempt: int = 0
+        while True:
+            self.acquire(cost)
+            try:
+                return request.execute()
+            except API_ERRORS as error:
+                if attempt >= self.max_retries or not self.is_retriable(error):
+                    raise
+                logging.warning(f"Erreur transitoire ({error}), nouvel essai")
+                self.backoff(attempt)
+                attempt += 1
+
+    def get_summary(self) -> str:
+        return (f"API Google: {self.nb_calls} requêtes | {self.nb_retries} reprises | "
+                f"{self.nb_throttled} attentes de quota")
+
+    def reset(self) -> None:
+        """
+        Remet à zéro les compteurs (nouveau cycle du mode démon).
+        """
+        with self.lock:
+            self.nb_calls = self.nb_retries = self.nb_throttled = 0
+
+
+class FairQueue:
+    """
+    File d'un client (club) d'un FairPool, utilisable comme un ThreadPoolExecutor (submit).
+    """
+
+    def __init__(self, pool: 'FairPool', key: str):
+        self.pool: FairPool = pool
+        self.key: str = key
+
+    def submit(self, fn, *args) -> Future:
+        return self.pool.submit(self.key, fn, *args)
+
+
+class FairPool:
+    """
+    Pool de threads partagé par plusieurs clients (clubs) : chaque client a sa file de tâches,
+    et les threads servent les files à tour de rôle. Un club qui soumet beaucoup de tâches
+    ne retarde donc pas les autres de plus d'une tâche chacun.
+    """
+
+    def __init__(self, max_workers: int, name: str = 'fair'):
+        self.condition: threading.Condition = threading.Condition()
+        self.queues: dict[str, collections.deque] = {}
+        # Clients ayant des tâches en attente, dans l'ordre où ils seront servis
+        self.turns: collections.deque[str] = collections.deque()
+        self.is_shutdown: bool = False
+        self.threads: list[threading.Thread] = [
+            threading.Thread(target=self._work, name=f'{name}-{number}', daemon=True)
+            for number in range(max_workers)]
+        for thread in self.threads:
+            thread.start()
+
+    def submit(self, key: str, fn, *args) -> Future:
+        future: Future = Future()
+        with self.condition:
+            if self.is_shutdown:
+                raise RuntimeError("FairPool arrêté")
+            queue: collections.deque = self.queues.setdefault(key, collections.deque())
+            if not queue:
+                self.turns.append(key)
+            queue.append((future, fn, args))
+            self.condition.notify()
+        return future
+
+    def get_queue(self, key: str) -> FairQueue:
+        return FairQueue(self, key)
+
+    def _next(self) -> tuple[str, tuple] | None:
+        """
+        Retourne la prochaine tâche (celle du client dont c'est le tour) et son client,
+        ou None à l'arrêt du pool.
+        """
+        with self.condition:
+            while not self.turns and not self.is_shutdown:
+                self.condition.wait()
+            if not self.turns:
+                return None
+            key: str = self.turns.popleft()
+            queue: collections.deque = self.queues[key]
+            task: tuple = queue.popleft()
+            if queue:
+                self.turns.append(key)
+            return key, task
+
+    def _work(self) -> None:
+        while (item := self._next()) is not None:
+            key, (future, fn, args) = item
+            if not future.set_running_or_notify_cancel():
+                continue
+            # Les lignes du journal écrites par la tâche portent le nom de son client
+            _LOG_TENANT.name = key
+            try:
+                result = fn(*args)
+            except BaseException as error:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+            finally:
+                _LOG_TENANT.name = None
+
+    def shutdown(self) -> None:
+        """
+        Arrête le pool une fois toutes les tâches en attente exécutées.
+        """
+        with self.condition:
+            self.is_shutdown = True
+            self.condition.notify_all()
+        for thread in self.threads:
+            thread.join()
+
+
+def _prom_label(value: str) -> str:
+    """
+    Échappe une valeur d'étiquette Prometheus.
+    """
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class RunMetrics:
+    """
+    Mesures d'une synchronisation, par activité et par calendrier : durée de chaque phase
+    (fetch, parse, transform, list, diff, write) et compteurs (octets téléchargés, lignes lues,
+    sorties créées, mises à jour, identiques...). Exportées dans un rapport JSON, un fichier
+    texte Prometheus et le message Zapier. Partagé entre les threads.
+    """
+
+    def __init__(self, report_path: str | None = None, prom_path: str | None = None,
+                 tenant: str | None = None):
+        self.report_path: str | None = report_path
+        self.prom_path: str | None = prom_path
+        # Club mesuré (--config) : ajouté au rapport et en étiquette des mesures Prometheus
+        self.tenant: str | None = tenant
+        self.lock: threading.Lock = threading.Lock()
+        self.started_at: str = ''
+        self.start: float = 0.0
+        # {'activity' | 'calendar': {nom: {phase: secondes}}}
+        self.phases: dict[str, dict[str, dict[str, float]]] = {}
+        # {'activity' | 'calendar': {nom: {compteur: valeur}}}
+        self.counters: dict[str, dict[str, dict[str, int]]] = {}
+        # Pic de mémoire de chaque phase, en octets (seulement si tracemalloc est actif)
+        self.memory: dict[str, dict[str, dict[str, int]]] = {}
+        self.reset()
+
+    @contextlib.contextmanager
+    def measure(self, kind: str, name: str, phase: str):
+        """
+        Mesure la durée d'une phase pour une activité (kind='activity') ou un calendrier ('calendar').
+        Si tracemalloc est actif (--profile-memory), le pic de mémoire allouée pendant la phase
+        est aussi relevé. Il est approximatif si des phases s'exécutent en même temps.
+        """
+        tracing: bool = tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.reset_peak()
+            start_memory: int = tracemalloc.get_traced_memory()[0]
+        start: float = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration: float = time.perf_counter() - start
+            with self.lock:
+                phases: dict[str, float] = self.phases.setdefault(kind, {}).setdefault(name, {})
+                phases[phase] = phases.get(phase, 0.0) + duration
+                if tracing:
+                    memory: dict[str, int] = self.memory.setdefault(kind, {}).setdefault(name, {})
+                    memory[phase] = max(memory.get(phase, 0), tracemalloc.get_traced_memory()[1] - start_memory)
+
+    def count(self, kind: str, name: str, counter: str, value: int = 1) -> None:
+        with self.lock:
+            counters: dict[str, int] = self.counters.setdefault(kind, {}).setdefault(name, {})
+            counters[counter] = counters.get(counter, 0) + value
+
+    def get_report(self, scheduler: ApiScheduler) -> dict:
+        """
+        Retourne le rapport de la synchronisation, avec les compteurs de l'API Google.
+        """
+        with self.lock:
+            report: dict = {
+                'started_at': self.started_at,
+                'duration': round(time.perf_counter() - self.start, 3),
+                'api': {'calls': scheduler.nb_calls, 'retries': scheduler.nb_retries,
+                        'throttled': scheduler.nb_throttled},
+            }
+            if self.tenant is not None:
+                report['tenant'] = self.tenant
+            for kind in ('activity', 'calendar'):
+                report[kind] = {
+                    name: {'phases': {phase: round(duration, 3)
+                                      for phase, duration in self.phases.get(kind, {}).get(name, {}).items()},
+                           'counters': dict(self.counters.get(kind, {}).get(name, {})),
+                           'memory_peak': dict(self.memory.get(kind, {}).get(name, {}))}
+                    for name in sorted(set(self.phases.get(kind, {})) | set(self.counters.get(kind, {})))}
+        return report
+
+    @staticmethod
+    def get_prometheus(report: dict) -> str:
+        """
+        Met le rapport au format texte de Prometheus.
+        Les mesures d'un club (--config) portent l'étiquette tenant.
+        """
+        tenant: str = f'tenant="{_prom_label(report["tenant"])}",' if 'tenant' in report else ''
+        run_labels: str = f'{{{tenant[:-1]}}}' if tenant else ''
+        lines: list[str] = [
+            '# HELP asvette_run_duration_seconds Durée de la dernière synchronisation.',
+            '# TYPE asvette_run_duration_seconds gauge',
+            f"asvette_run_duration_seconds{run_labels} {report['duration']}",
+            "# HELP asvette_api_requests Requêtes à l'API Google de la dernière synchronisation.",
+            '# TYPE asvette_api_requests gauge',
+        ]
+        lines += [f'asvette_api_requests{{{tenant}type="{key}"}} {value}' for key, value in report['api'].items()]
+        lines += ['# HELP asvette_phase_seconds Durée de chaque phase de la dernière synchronisation.',
+                  '# TYPE asvette_phase_seconds gauge']
+        lines += [f'asvette_phase_seconds{{{tenant}kind="{kind}",name="{_prom_label(name)}",phase="{phase}"}} '
+                  f'{duration}'
+                  for kind in ('activity', 'calendar') for name, values in report[kind].items()
+                  for phase, duration in values['phases'].items()]
+        lines += ['# HELP asvette_count Compteurs de la dernière synchronisation.',
+                  '# TYPE asvette_count gauge']
+        lines += [f'asvette_count{{{tenant}kind="{kind}",name="{_prom_label(name)}",counter="{counter}"}} {value}'
+                  for kind in ('activity', 'calendar') for name, values in report[kind].items()
+                  for counter, value in values['counters'].items()]
+        lines += ['# HELP asvette_phase_memory_peak_bytes Pic de mémoire de chaque phase (--profile-memory).',
+                  '# TYPE asvette_phase_memory_peak_bytes gauge']
+        lines += [f'asvette_phase_memory_peak_bytes{{{tenant}kind="{kind}",name="{_prom_label(name)}",'
+                  f'phase="{phase}"}} {peak}'
+                  for kind in ('activity', 'calendar') for name, values in report[kind].items()
+                  for phase, peak in values['memory_peak'].items()]
+        lines.append(f'asvette_last_run_timestamp_seconds{run_labels} {time.time():.0f}')
+        return '\n'.join(lines) + '\n'
+
+    def export(self, scheduler: ApiScheduler) -> dict:
+        """
+        Écrit le rapport JSON et le fichier Prometheus (remplacé d'un bloc, pour que
+        le collecteur ne lise jamais un fichier incomplet).
+        :return: Le rapport
+        """
+        report: dict = self.get_report(scheduler)
+        if self.report_path is not None:
+            with open(self.report_path, 'w') as report_file:
+                json.dump(report, report_file, indent=2, ensure_ascii=False)
+        if self.prom_path is not None:
+            with open(self.prom_path + '.tmp', 'w') as prom_file:
+                prom_file.write(self.get_prometheus(report))
+            os.replace(self.prom_path + '.tmp', self.prom_path)
+        return report
+
+    def reset(self) -> None:
+        """
+        Remet à zéro les mesures (nouveau cycle du mode démon).
+        """
+        with self.lock:
+            self.started_at = datetime.datetime.now().isoformat(timespec='seconds')
+            self.start = time.perf_counter()
+            self.phases = {}
+            self.counters = {}
+            self.memory = {}
+
+
+class ListingError(Exception):
+    """
+    Le listing d'un calendrier Google a échoué (après les reprises de l'ordonnanceur).
+    """
+
+
+class LeaseLostError(Exception):
+    """
+    Le bail des calendriers a été repris par une autre exécution : plus aucune écriture n'est envoyée.
+    """
 
 
 class GoogleCalendar:
 
-    def __init__(self, service, name: str, calendar_id: str):
+    def __init__(self, service, name: str, calendar_id: str, time_max: str | None = None,
+                 sync_store: SyncStore | None = None, state: StateStore | None = None,
+                 scheduler: ApiScheduler | None = None, metrics: RunMetrics | None = None):
         self.service = service
+        # Tous les appels à l'API passent par l'ordonnanceur (quota et reprises)
+        self.scheduler: ApiScheduler = ApiScheduler() if scheduler is None else scheduler
+        self.metrics: RunMetrics = RunMetrics() if metrics is None else metrics
         self.name: str = name
         self.id: str = calendar_id
-        self.events: pd.DataFrame = self._get_events()
-        self.is_events_empty: bool = self.events.empty
-        self.nb_events: int = self.events.shape[0]
+        # Borne haute du listing (RFC3339). None = pas de limite.
+        self.time_max: str | None = time_max
+        # Si présent, le listing est incrémental (syncToken)
+        self.sync_store: SyncStore | None = sync_store
+        # État local des sorties synchronisées, mis à jour à chaque écriture réussie
+        self.state: StateStore | None = state
+        # Etag Google de chaque événement, par Id
+        self.etags: dict[str, str] = {}
+        # Événements du calendrier au format ASVETTE, par Id
+        with self.metrics.measure('calendar', self.name, 'list'):
+            self.events: dict[str, CalendarEvent] = self._get_events()
+        self.metrics.count('calendar', self.name, 'listed', len(self.events))
+
+    @property
+    def is_events_empty(self) -> bool:
+        return not self.events
+
+    @property
+    def nb_events(self) -> int:
+        return len(self.events)
+
+    def _store_event(self, event: dict) -> None:
+        """
+        Met à jour la copie locale du calendrier après une écriture réussie,
+        pour que les activités suivantes partageant ce calendrier la voient.
+        :param event: Événement renvoyé par l'API Google Calendar
+        """
+        self.etags[event['id']] = event.get('etag')
+        self.events[event['id']] = self._get_event_row(event)
 
-    def _get_events(self):
+    def _list_pages(self, **params):
+        """
+        Parcourt les pages de résultats de events.list (nextPageToken).
+        Une erreur 410 (jeton de synchronisation expiré) est propagée à l'appelant.
+        :param params: Paramètres de la requête events.list
+        :return: Générateur des pages de résultats
+        :raise ListingError: Si une page ne peut pas être lue
+        """
+        page_token: str | None = None
+        while True:
+            try:
+                events_result: dict = self.scheduler.execute(
+                    self.service.events().list(calendarId=self.id, pageToken=page_token, **params))
+            except HttpError as error:
+                if error.resp.status == 410 and 'syncToken' in params:
+                    raise
+                raise ListingError(f"Le calendrier {self.name} n'a pas pu être lu: {error}") from error
+            except API_ERRORS as error:
+                raise ListingError(f"Le calendrier {self.name} n'a pas pu être lu: {error}") from error
+            yield events_result
+            page_token = events_result.get("nextPageToken")
+            if page_token is None:
+                return
+
+    def _get_events(self) -> dict[str, CalendarEvent]:
         """
             Cette fonction va chercher les sorties de l'activité sur Google Calendar
-            et les mettre en forme dans un DataFrame.
+            et les mettre en forme au format ASVETTE, par Id.
+            Les pages de résultats sont parcourues une à une (nextPageToken), limitées à la
+            période publiée sur ASVETTE, et seuls les champs utiles sont demandés.
+            En mode incrémental, seuls les changements depuis la dernière exécution sont lus.
             """
-        # Call the Calendar API
-        now: str = datetime.datetime.now().isoformat() + "Z"  # 'Z' indicates UTC time
-        try:
-            events_result = (
-                self.service.events()
-                .list(
-                    calendarId=self.id,
-                    timeMin=now,
-                    singleEvents=True,
-                    orderBy="startTime",
-                )
-                .execute()
-            )
-            events: list = events_result.get("items", [])
-        except HttpError as error:
-            logging.error(f"Une erreur s'est produite: {error}")
-            sys.exit(1)
-        except httplib2.error.ServerNotFoundError as error:
-            logging.error(f"Une erreur s'est produite: {error}")
-            sys.exit(1)
-        event_list: list[list[str]] = [['Id', 'Subject', SD_str, ST_str,
-                                        ED_str, ET_str, ADE_str,
-                                        'Description', 'Location', 'Private']]
-        for event in events:
-            row = self._get_event_row(event)
-            event_list.append(row)
-        df: pd.DataFrame = pd.DataFrame(event_list[1:], columns=event_list[0])
-        return df
-
-    def add_event(self, event: dict) -> None:
-        """
-        Ajoute un nouvel événement dans le calendrier Google en utilisant l'API Google Calendar.
-        :param: event (dict) : Événement à ajouter. Dictionnaire tel que décrit ici :
-        https://developers.google.com/calendar/api/v3/reference/events/insert
+        rows: dict[str, CalendarEvent] = {}
+        if self.sync_store is not None:
+            for event in self._sync_events().values():
+                self.etags[event['id']] = event.get('etag')
+                rows[event['id']] = self._get_event_row(event)
+        else:
+            # Call the Calendar API
+            now: str = datetime.datetime.now().isoformat() + "Z"  # 'Z' indicates UTC time
+            params: dict = {'timeMin': now, 'timeMax': self.time_max, 'singleEvents': True,
+                            'orderBy': "startTime", 'maxResults': LIST_PAGE_SIZE}
+            legacy: list[str] = []
+            for events_result in self._list_pages(fields=LIST_FIELDS, **params):
+                # On construit les lignes au fil des pages
+                for event in events_result.get("items", []):
+                    self.etags[event['id']] = event.get('etag')
+                    rows[event['id']] = self._get_event_row(event)
+                    # Les événements ajoutés à la main n'ont jamais d'empreinte : ils sont ignorés
+                    if not rows[event['id']].content_hash and event['id'].startswith(EVENT_ID_PREFIX):
+                        legacy.append(event['id'])
+            # Les événements du script sans empreinte sont relus un à un, avec tous leurs champs
+            for event in self._get_full_events(legacy):
+                self.etags[event['id']] = event.get('etag')
+                rows[event['id']] = self._get_event_row(event)
+        return rows
+
+    def load_events(self, event_ids: list[str]) -> None:
+        """
+        Remplace dans la copie locale les lignes du listing léger de ces événements
+        par leur contenu complet (events.get).
+        """
+        with self.metrics.measure('calendar', self.name, 'list'):
+            for event in self._get_full_events(event_ids):
+                self._store_event(event)
 
-        :return: Message indiquant le résultat de l'opération.
-        :rtype: Str
+    def _get_full_events(self, event_ids: list[str]) -> list[dict]:
+        """
+        Relit des événements avec tous leurs champs (events.get), par lots de BATCH_SIZE.
+        Un événement qui ne peut pas être relu garde sa ligne du listing léger.
+        :return: Les événements relus
+        """
+        events: list[dict] = []
+
+        def callback(request_id: str, response: dict, exception: HttpError | None) -> None:
+            if exception is None:
+                events.append(response)
+            else:
+                logging.warning(f"Événement {request_id} non relu: {exception}")
+
+        for start in range(0, len(event_ids), BATCH_SIZE):
+            chunk: list[str] = event_ids[start:start + BATCH_SIZE]
+            batch = self.service.new_batch_http_request()
+            for event_id in chunk:
+                batch.add(self.service.events().get(calendarId=self.id, eventId=event_id),
+                          callback=callback, request_id=event_id)
+            try:
+                self.scheduler.execute(batch, cost=len(chunk))
+            except API_ERRORS as error:
+                logging.warning(f"Le lot de {len(chunk)} événements n'a pas pu être relu: {error}")
+        return events
+
+    def _apply_changes(self, events: dict[str, dict], **params) -> str | None:
+        """
+        Applique à la copie locale les événements renvoyés par events.list :
+        les événements annulés sont retirés, les autres ajoutés ou remplacés.
+        :return: Le nouveau jeton de synchronisation (nextSyncToken)
+        """
+        sync_token: str | None = None
+        for events_result in self._list_pages(singleEvents=True, maxResults=LIST_PAGE_SIZE,
+                                              fields=SYNC_FIELDS, **params):
+            for event in events_result.get("items", []):
+                if event.get('status') == 'cancelled':
+                    events.pop(event['id'], None)
+                else:
+                    events[event['id']] = event
+            sync_token = events_result.get("nextSyncToken", sync_token)
+        return sync_token
+
+    def _sync_events(self) -> dict[str, dict]:
+        """
+        Synchronisation incrémentale : on ne demande à Google que les événements modifiés
+        depuis le dernier jeton enregistré. Si le jeton a expiré (410 Gone), on refait
+        un listing complet. Les événements annulés ou terminés ne sont pas conservés
+        dans la copie locale.
+        :return: La copie locale à jour des événements du calendrier (à venir), par Id
         """
+        state: dict = self.sync_store.get(self.id)
+        events: dict[str, dict] = state.get('events', {})
+        sync_token: str | None = state.get('sync_token')
         try:
-            added_event: dict = self.service.events().insert(calendarId=self.id,
-                                                             body=event).execute()
-            logging.info(f'Événement créé: {added_event.get("summary")}')
+            if sync_token is None:
+                sync_token = self._apply_changes(events)
+            else:
+                sync_token = self._apply_changes(events, syncToken=sync_token)
         except HttpError as error:
+            if error.resp.status != 410:
+                raise
+            logging.warning(f"Jeton de synchronisation expiré pour {self.name}: listing complet")
+            events = {}
+            sync_token = self._apply_changes(events)
+        # Un événement terminé n'est plus comparé aux sorties ASVETTE : s'il est modifié plus tard,
+        # le jeton de synchronisation le renverra
+        today: str = datetime.date.today().isoformat()
+        events = {event_id: event for event_id, event in events.items()
+                  if event['end'].get('dateTime', event['end'].get('date', today))[:10] >= today}
+        self.sync_store.set(self.id, sync_token, events)
+        return events
+
+    def _get_request(self, action: str, event: dict, columns: tuple[str, ...] = ()):
+        """
+        Construit la requête API (sans l'exécuter) correspondant à une écriture.
+        Un PATCH ne contient que les champs modifiés et n'est appliqué que si l'événement
+        n'a pas changé sur Google depuis sa lecture (If-Match sur l'etag).
+        :param action: 'insert', 'update', 'patch' ou 'refresh' (relecture de l'événement)
+        :param event: Événement au format de l'API Google Calendar
+        :param columns: Champs de la sortie modifiés (PATCH)
+        """
+        if action == 'insert':
+            return self.service.events().insert(calendarId=self.id, body=event)
+        if action == 'update':
+            return self.service.events().update(calendarId=self.id, eventId=event['id'], body=event)
+        if action == 'refresh':
+            return self.service.events().get(calendarId=self.id, eventId=event['id'])
+        request = self.service.events().patch(calendarId=self.id, eventId=event['id'],
+                                              body=get_patch(event, columns))
+        if self.etags.get(event['id']):
+            request.headers['If-Match'] = self.etags[event['id']]
+        return request
+
+    def _get_changed_columns(self, event: dict, google_event: dict) -> tuple[str, ...] | None:
+        """
+        Compare un événement à envoyer avec sa version actuelle sur Google.
+        :return: Les champs à modifier, ou None si l'événement Google est déjà à jour
+        """
+        row: CalendarEvent = self._get_event_row(event)
+        google_row: CalendarEvent = self._get_event_row(google_event)
+        if row.content_hash == google_row.content_hash:
+            return None
+        return tuple(field for field in SORTIE_FIELDS
+                     if field != 'id' and getattr(row, field) != getattr(google_row, field))
+
+    def _get_callback(self, action: str, event: dict, attempt: int, columns: tuple[str, ...],
+                      retries: list[tuple[str, dict, int, tuple[str, ...]]], outcomes: dict[str, str]):
+        """
+        Retourne la fonction de rappel d'une sous-requête du batch.
+        Un conflit (409) sur un ajout est remis dans la file pour être envoyé
+        comme mise à jour au batch suivant. Un échec de précondition (412) sur un PATCH
+        entraîne la relecture de l'événement puis un nouveau PATCH. Une erreur de quota
+        ou transitoire est remise dans la file pour une nouvelle tentative.
+        Le résultat final de chaque événement est noté dans outcomes : l'action réussie,
+        ou 'failed'.
+        """
+        def callback(request_id: str, response: dict, exception: HttpError | None) -> None:
+            if exception is None and action == 'refresh':
+                # L'événement a été modifié sur Google : on recalcule le PATCH
+                self._store_event(response)
+                changed: tuple[str, ...] | None = self._get_changed_columns(event, response)
+                if changed is None:
+                    outcomes[event['id']] = 'patch'
+                    if self.state is not None:
+                        self.state.record(self.id, event, response.get('etag'))
+                else:
+                    retries.append(('patch', event, attempt, changed))
+            elif exception is None:
+                verb: str = 'créé' if action == 'insert' else 'mis à jour'
+                logging.info(f'Événement {verb}: {response.get("summary")}')
+                self.metrics.count('calendar', self.name, 'written')
+                outcomes[event['id']] = action
+                self._store_event(response)
+                if self.state is not None:
+                    self.state.record(self.id, event, response.get('etag'))
             # Si l'événement a été supprimé du calendrier. L'id existe et cela génère une erreur.
-            if error.resp.status == 409:
-                self.update_event(event)
+            elif action == 'insert' and exception.resp.status == 409:
+                retries.append(('update', event, attempt, columns))
+            # Si l'événement a été modifié sur Google depuis sa lecture
+            elif action == 'patch' and exception.resp.status == 412 and attempt < self.scheduler.max_retries:
+                retries.append(('refresh', event, attempt + 1, columns))
+            elif self.scheduler.is_retriable(exception) and attempt < self.scheduler.max_retries:
+                retries.append((action, event, attempt + 1, columns))
             else:
-                logging.error(f"Une erreur s'est produite: {error}\n"
-                              f"{event.get('summary')} n'a pas pu être ajouté.\n{event}")
-
-    def update_event(self, event: dict) -> None:
+                verb = 'ajouté' if action == 'insert' else 'mis à jour'
+                self.metrics.count('calendar', self.name, 'failed')
+                outcomes[event['id']] = 'failed'
+                logging.error(f"Une erreur s'est produite: {exception}\n"
+                              f"{event.get('summary')} n'a pas pu être {verb}.\n{event}")
+        return callback
+
+    def execute_plan(self, plan: dict[str, list]) -> dict[str, str]:
         """
-        This function updates an event in a Google Calendar using the Google Calendar API.
-
-        Parameters:
-        service (googleapiclient.discovery.Resource): The Google Calendar API service.
-        google_id (str): The ID of the Google Calendar.
-        event (dict): The event to be updated in the Google Calendar.
-
-        Returns:
-        None
+        Envoie les écritures d'un plan via l'API batch de Google Calendar,
+        par paquets de BATCH_SIZE requêtes.
+        :param plan: {'insert': [événements], 'update': [événements],
+                      'patch': [(événement, champs modifiés)]}
+        :return: Le résultat de chaque événement du plan, par Id : l'action réussie
+                 ('insert', 'update' ou 'patch'), ou 'failed'
         """
-        try:
-            updated_event: dict = self.service.events().update(calendarId=self.id,
-                                                               eventId=event['id'],
-                                                               body=event).execute()
-            logging.info(f'Événement mis à jour: {updated_event.get("summary")}')
-        except HttpError as error:
-            logging.error(f"Une erreur s'est produite: {error}\n{event.get('summary')} n'a \
-            pas pu être mis à jour.\n{event}")
+        pending: list[tuple[str, dict, int, tuple[str, ...]]] = (
+                [('insert', event, 0, ()) for event in plan.get('insert', [])] +
+                [('update', event, 0, ()) for event in plan.get('update', [])] +
+                [('patch', event, 0, columns) for event, columns in plan.get('patch', [])])
+        outcomes: dict[str, str] = {}
+        while pending:
+            # Délai avant de reprendre des sous-requêtes en erreur de quota ou transitoire
+            attempt: int = max(attempt for _, _, attempt, _ in pending)
+            if attempt > 0:
+                self.scheduler.backoff(attempt - 1)
+            retries: list[tuple[str, dict, int, tuple[str, ...]]] = []
+            for start in range(0, len(pending), BATCH_SIZE):
+                batch = self.service.new_batch_http_request()
+                chunk: list[tuple[str, dict, int, tuple[str, ...]]] = pending[start:start + BATCH_SIZE]
+                for action, event, attempt, columns in chunk:
+                    batch.add(self._get_request(action, event, columns),
+                              callback=self._get_callback(action, event, attempt, columns, retries, outcomes))
+                try:
+                    self.scheduler.execute(batch, cost=len(chunk))
+                except API_ERRORS as error:
+                    logging.error(f"Une erreur s'est produite: {error}\n"
+                                  f"Le lot de {len(chunk)} événements n'a pas pu être envoyé.")
+                    self.metrics.count('calendar', self.name, 'failed', len(chunk))
+                    for _, event, _, _ in chunk:
+                        outcomes[event['id']] = 'failed'
+            pending = retries
+        return outcomes
 
     @staticmethod
-    def _get_event_row(event: dict) -> list:
+    def _get_event_row(event: dict) -> CalendarEvent:
         """
         Cette fonction prend un événement Google Calendar en entrée et renvoie
-        la ligne correspondante au format ASVETTE.
+        la sortie correspondante au format ASVETTE.
+
+        Si l'événement a été lu sans son contenu (listing léger), seuls l'Id
+        et l'empreinte sont renseignés.
 
         :param event: Un événement Google Calendar
         :type event: dict
-        :return: la ligne correspondante au format CSV/ASVETTE
-        :rtype: list
+        :return: la sortie correspondante au format ASVETTE, avec l'empreinte
+        :rtype: CalendarEvent
         """
-        row: list = [event['id']]
+        private: dict = event.get('extendedProperties', {}).get('private', {})
+        content_hash: str = private.get(HASH_KEY, '') if private.get(HASH_SCHEMA_KEY) == HASH_SCHEMA else ''
+        if 'start' not in event:
+            return CalendarEvent(event['id'], '', '', '', '', '', False, '', '', '', content_hash)
         start: str = event['start'].get('dateTime', event['start'].get('date'))
         end: str = event['end'].get('dateTime', event['end'].get('date'))
-        row.append(event['summary'])
         # get the start date in format 'YYY-MM-DD'
         if 'T' in start:
-            start_date_str: str = start.split('T')[0]
-            row.append(start_date_str)
-            start_time_str: str = start.split('T')[1].split('+')[0]
-            row.append(start_time_str)
-            start_time = datetime.datetime.strptime(start_time_str, '%H:%M:%S')
-            all_day: str = 'TRUE' if start_time.hour < 10 else 'FALSE'
+            start_date, start_time = start.split('T')[0], start.split('T')[1].split('+')[0]
+            all_day: bool = int(start_time[:2]) < 10
         else:
-            row.append(start)
-            row.append('')
-            all_day = 'TRUE'
+            start_date, start_time = start, ''
+            all_day = True
         if 'T' in end:
-            row.append(end.split('T')[0])
-            row.append(end.split('T')[1].split('+')[0])
+            end_date, end_time = end.split('T')[0], end.split('T')[1].split('+')[0]
         else:
-            row.append(end)
-            row.append('')
-        row.append(all_day)
-        row.append(event['description'] if 'description' in event.keys() else '')
-        row.append(event['location'] if 'location' in event.keys() else '')
-        row.append('')  # Private
-        return row
+            end_date, end_time = end, ''
+        return CalendarEvent(event['id'], event['summary'], start_date, start_time, end_date, end_time,
+                             all_day, event.get('description', ''), event.get('location', ''),
+                             event.get('source', {}).get('url', ''), content_hash)
+
+
+class CalendarRegistry:
+    """
+    Regroupe les activités par calendrier Google (google_id).
+    Chaque calendrier n'est listé qu'une seule fois par exécution et la même copie
+    est partagée par toutes les activités qui y écrivent.
+    """
+
+    def __init__(self, service, activities: list['Activity'], sync_store: SyncStore | None = None,
+                 state: StateStore | None = None, scheduler: ApiScheduler | None = None,
+                 metrics: RunMetrics | None = None, lease: Lease | None = None):
+        self.service = service
+        self.scheduler: ApiScheduler = ApiScheduler() if scheduler is None else scheduler
+        # Bail des calendriers, vérifié avant chaque envoi d'écritures
+        self.lease: Lease | None = lease
+        self.metrics: RunMetrics = RunMetrics() if metrics is None else metrics
+        self.sync_store: SyncStore | None = sync_store
+        self.state: StateStore | None = state
+        self.names: dict[str, list[str]] = {}
+        # Dernière date de fin publiée sur ASVETTE, par calendrier
+        self.last_dates: dict[str, str] = {}
+        for act in activities:
+            self.add(act)
+        self.calendars: dict[str, GoogleCalendar] = {}
+
+    def add(self, act: 'Activity') -> None:
+        """
+        Déclare une activité écrivant dans l'un des calendriers.
+        Toutes les activités d'un calendrier doivent être déclarées avant sa lecture (get).
+        """
+        self.names.setdefault(act.cal_id, []).append(act.name)
+        if not act.is_events_empty:
+            last_date: str = max(sortie.end_date for sortie in act.events)
+            self.last_dates[act.cal_id] = max(last_date, self.last_dates.get(act.cal_id, last_date))
+
+    def _get_time_max(self, calendar_id: str) -> str | None:
+        """
+        Retourne la borne haute du listing Google : le lendemain de la dernière sortie publiée.
+        """
+        if calendar_id not in self.last_dates:
+            return None
+        last_date = datetime.datetime.strptime(self.last_dates[calendar_id], '%Y-%m-%d')
+        return (last_date + datetime.timedelta(days=1)).strftime('%Y-%m-%dT00:00:00Z')
+
+    def check_lease(self, calendar_id: str) -> None:
+        """
+        Vérifie que le bail des calendriers est toujours tenu avant d'écrire dans l'un d'eux.
+        :raise LeaseLostError: Si le bail a été repris par une autre exécution
+        """
+        if self.lease is not None and self.lease.is_lost:
+            raise LeaseLostError(f"Le bail du calendrier {calendar_id} a été repris par une autre exécution, "
+                                 f"écritures abandonnées")
+
+    def get(self, calendar_id: str) -> GoogleCalendar:
+        """
+        Retourne le calendrier Google correspondant, en le listant au premier appel seulement.
+        :param calendar_id: Id du calendrier Google
+        :return: Le calendrier Google partagé
+        """
+        if calendar_id not in self.calendars:
+            name: str = ', '.join(self.names.get(calendar_id, [calendar_id]))
+            self.calendars[calendar_id] = GoogleCalendar(self.service, name, calendar_id,
+                                                         self._get_time_max(calendar_id),
+                                                         self.sync_store, self.state, self.scheduler,
+                                                         self.metrics)
+        return self.calendars[calendar_id]
+
+
+# Balise ouvrante du tableau des sorties (et non une simple mention de table_sortie dans un script)
+TABLE_SORTIE_RE: re.Pattern = re.compile(rb'<table\b[^>]*\bid\s*=\s*["\']?table_sortie\b', re.IGNORECASE)
+TABLE_END_RE: re.Pattern = re.compile(rb'</table\s*>', re.IGNORECASE)
+
+
+def _get_table_fragment(content: bytes) -> bytes | None:
+    """
+    Extrait du code HTML de la page le seul tableau des sorties (table#table_sortie).
+    """
+    match: re.Match | None = TABLE_SORTIE_RE.search(content)
+    if match is None:
+        return None
+    end: re.Match | None = TABLE_END_RE.search(content, match.end())
+    if end is None:
+        return None
+    return content[match.start():end.end()]
+
+
+def get_fingerprint(content: bytes) -> str:
+    """
+    Retourne l'empreinte (SHA-256) du tableau des sorties d'une page ASVETTE.
+    """
+    fragment: bytes | None = _get_table_fragment(content)
+    return hashlib.sha256(content if fragment is None else fragment).hexdigest()
+
+
+def _is_row_complete(cells: list, headers: list[str]) -> bool:
+    """
+    Indique si une ligne du tableau a une cellule par colonne. Les colonnes étant ensuite
+    recombinées en lignes, une ligne incomplète (ligne d'en-tête, « aucune sortie » sur
+    plusieurs colonnes, cellule manquante) décalerait toutes les suivantes : elle est ignorée.
+    """
+    if len(cells) == len(headers):
+        return True
+    if cells:
+        logging.warning(f"Ligne du tableau des sorties ignorée: {len(cells)} cellules pour {len(headers)} colonnes")
+    return False
+
+
+def parse_table_lxml(content: bytes) -> dict[str, list[str]]:
+    """
+    Analyse le tableau des sorties avec lxml (parseur C) : seul le fragment du tableau
+    est construit et les cellules sont rangées directement par colonne. Si le fragment
+    n'est pas trouvé, toute la page est analysée.
+    :param content: Contenu de la page liste-sortie.php
+    :return: {en-tête: [valeurs de la colonne]}, vide si le tableau est absent
+    """
+    fragment: bytes | None = _get_table_fragment(content)
+    try:
+        markup: str = (content if fragment is None else fragment).decode('utf-8')
+    except UnicodeDecodeError:
+        markup = (content if fragment is None else fragment).decode('cp1252', errors='replace')
+    import lxml.html
+    if fragment is None:
+        tables: list = lxml.html.document_fromstring(markup).xpath('//table[@id="table_sortie"]')
+        if not tables:
+            return {}
+        table = tables[0]
+    else:
+        table = lxml.html.fragment_fromstring(markup)
+    headers: list[str] = [header.text_content().strip() for header in table.iter('th')]
+    columns: list[list[str]] = [[] for _ in headers]
+    for row in table.iter('tr'):
+        cells: list = row.findall('td')
+        if _is_row_complete(cells, headers):
+            for column, cell in zip(columns, cells):
+                column.append(cell.text_content().strip())
+    return dict(zip(headers, columns))
+
+
+def parse_table_bs4(content: bytes) -> dict[str, list[str]]:
+    """
+    Analyse le tableau des sorties avec BeautifulSoup (html.parser), en ne construisant
+    que le tableau des sorties.
+    :param content: Contenu de la page liste-sortie.php
+    :return: {en-tête: [valeurs de la colonne]}, vide si le tableau est absent
+    """
+    from bs4 import BeautifulSoup, SoupStrainer
+    soup: BeautifulSoup = BeautifulSoup(content, "html.parser",
+                                        parse_only=SoupStrainer("table", id="table_sortie"))
+    table = soup.find("table", {"id": "table_sortie"})
+    if table is None:
+        return {}
+    headers: list[str] = [header.text.strip() for header in table.find_all("th")]
+    columns: list[list[str]] = [[] for _ in headers]
+    for row in table.find_all("tr"):
+        cells: list = row.find_all("td")
+        if _is_row_complete(cells, headers):
+            for column, cell in zip(columns, cells):
+                column.append(cell.text.strip())
+    return dict(zip(headers, columns))
+
+
+# Parseurs HTML disponibles. lxml (optionnel) est utilisé s'il est installé.
+HTML_PARSERS: dict[str, Callable[[bytes], dict[str, list[str]]]] = {'html.parser': parse_table_bs4}
+if importlib.util.find_spec('lxml') is not None:
+    HTML_PARSERS['lxml'] = parse_table_lxml
+HTML_PARSER: str = 'lxml' if 'lxml' in HTML_PARSERS else 'html.parser'
+
+
+class PageCache:
+    """
+    Cache sur disque des pages ASVETTE, par URL d'activité : validateurs HTTP (ETag,
+    Last-Modified) et empreinte du tableau des sorties de la dernière synchronisation.
+    Une entrée n'est enregistrée qu'après la synchronisation complète de l'activité.
+    """
+
+    def __init__(self, path: str):
+        self.path: str = path
+        self.entries: dict[str, dict] = {}
+        self.pending: dict[str, dict] = {}
+        if os.path.exists(path):
+            try:
+                with open(path) as cache_file:
+                    self.entries = json.load(cache_file)
+            except (OSError, ValueError) as error:
+                logging.warning(f"Cache {path} illisible, il sera recréé: {error}")
+
+    def get_headers(self, url: str) -> dict[str, str]:
+        """
+        Retourne les en-têtes de requête conditionnelle pour cette URL.
+        """
+        entry: dict = self.entries.get(url, {})
+        headers: dict[str, str] = {}
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def is_unchanged(self, url: str, fingerprint: str) -> bool:
+        return self.entries.get(url, {}).get('fingerprint') == fingerprint
+
+    def update(self, url: str, response: requests.Response, fingerprint: str) -> None:
+        """
+        Prépare la nouvelle entrée de cache. Elle sera enregistrée par commit().
+        """
+        self.pending[url] = {
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'fingerprint': fingerprint,
+        }
+
+    def commit(self, url: str) -> None:
+        """
+        Valide l'entrée de cache d'une activité une fois sa synchronisation terminée.
+        """
+        if url in self.pending:
+            self.entries[url] = self.pending.pop(url)
+
+    def save(self) -> None:
+        with open(self.path, 'w') as cache_file:
+            json.dump(self.entries, cache_file, indent=2)
+
+
+def _get_detail_lines(content: bytes) -> list[str]:
+    """
+    Retourne le texte d'une page info-sortie.php, une ligne par cellule, paragraphe ou élément de liste.
+    """
+    try:
+        markup: str = content.decode('utf-8')
+    except UnicodeDecodeError:
+        markup = content.decode('cp1252', errors='replace')
+    markup = re.sub(r'(?is)<(script|style)\b.*?</\1>', '', markup)
+    markup = re.sub(r'(?i)<br\s*/?>|</?(td|th|tr|table|p|div|li|ul|ol|dl|dt|dd|h\d|title|head|body)\b[^>]*>',
+                    '\n', markup)
+    markup = re.sub(r'<[^>]*>', ' ', markup)
+    return [line for line in (' '.join(html.unescape(line).split()) for line in markup.split('\n')) if line]
+
+
+def _get_detail_value(field: str, value: str) -> str | None:
+    """
+    Met en forme la valeur d'un champ d'une page info-sortie.php ('HH:MM' pour les heures).
+    """
+    if field in ('start_time', 'end_time'):
+        match: re.Match | None = re.search(r'\b(\d{1,2})\s*[h:]\s*(\d{2})?', value, re.IGNORECASE)
+        if match is None or int(match[1]) > 23 or int(match[2] or 0) > 59:
+            return None
+        return f'{int(match[1]):02d}:{match[2] or "00"}'
+    if field == 'places_left':
+        match = re.search(r'\d+', value)
+        return None if match is None else match[0]
+    return value[:200] or None
+
+
+def parse_detail(content: bytes) -> dict[str, str]:
+    """
+    Analyse une page info-sortie.php : lieu de rendez-vous, heures de départ et de retour,
+    places restantes et état des inscriptions. La valeur d'un champ suit son libellé, sur
+    la même ligne ('Places restantes : 3') ou dans la cellule suivante.
+    :return: {champ de DETAIL_LABELS: valeur}, sans les champs absents de la page
+    """
+    lines: list[str] = _get_detail_lines(content)
+    fields: dict[str, str] = {}
+    for index, line in enumerate(lines):
+        lower: str = line.lower()
+        for field, labels in DETAIL_LABELS.items():
+            label: str | None = next((label for label in labels if lower.startswith(label)), None)
+            if label is None or field in fields:
+                continue
+            value: str = line[len(label):].strip(' :\u00a0')
+            if not value and index + 1 < len(lines):
+                value = lines[index + 1]
+            value = _get_detail_value(field, value)
+            if value is not None:
+                fields[field] = value
+            break
+    return fields
+
+
+def apply_details(sortie: Sortie, fields: dict[str, str]) -> Sortie:
+    """
+    Complète une sortie avec les champs de sa page info-sortie.php : ils sont ajoutés à la
+    description et, si la sortie n'est pas à la journée, les heures de départ et de retour
+    remplacent l'heure de fin arbitraire (départ + 3h).
+    """
+    lines: list[str] = []
+    if 'meeting_point' in fields:
+        lines.append(f"Rendez-vous : {fields['meeting_point']}")
+    if 'start_time' in fields or 'end_time' in fields:
+        lines.append('Horaires : ' + ' - '.join(fields[key] for key in ('start_time', 'end_time') if key in fields))
+    if 'places_left' in fields:
+        lines.append(f"Places restantes : {fields['places_left']}")
+    if 'registration' in fields:
+        lines.append(f"Inscriptions : {fields['registration']}")
+    if not lines:
+        return sortie
+    head, separator, tail = sortie.description.partition('<BR>')
+    description: str = head + ''.join('<BR>' + html.escape(line) for line in lines) + separator + tail
+    start_time: str = sortie.start_time
+    end_time: str = sortie.end_time
+    if not sortie.all_day:
+        start: datetime.datetime = datetime.datetime.combine(
+            datetime.date.fromisoformat(sortie.start_date),
+            datetime.time.fromisoformat(fields.get('start_time', sortie.start_time[:5])))
+        end: datetime.datetime = start + datetime.timedelta(hours=3)
+        if 'end_time' in fields:
+            returned: datetime.datetime = datetime.datetime.combine(datetime.date.fromisoformat(sortie.end_date),
+                                                                    datetime.time.fromisoformat(fields['end_time']))
+            if returned > start:
+                end = returned
+        start_time = start.strftime('%H:%M:%S')
+        end_time = end.strftime('%H:%M:%S')
+    return dataclasses.replace(sortie, description=description, start_time=start_time, end_time=end_time)
+
+
+class DetailCache:
+    """
+    Cache sur disque des champs des pages info-sortie.php, par URL de sortie. Une page est
+    téléchargée de nouveau après DETAIL_TTL ; à l'enregistrement, les pages périmées sont
+    retirées, puis les plus anciennes au-delà de max_entries. Partagé entre les threads.
+    """
+
+    def __init__(self, path: str, ttl: int = DETAIL_TTL, max_entries: int = DETAIL_CACHE_SIZE,
+                 trusted: bool = True):
+        self.path: str = path
+        self.ttl: int = ttl
+        self.max_entries: int = max_entries
+        self.lock: threading.Lock = threading.Lock()
+        # {URL de la sortie: {'fetched_at': horodatage, 'fields': {champ: valeur}}}
+        self.entries: dict[str, dict] = {}
+        # --no-cache : les pages déjà en cache sont toutes téléchargées de nouveau
+        if trusted and os.path.exists(path):
+            try:
+                with open(path) as cache_file:
+                    self.entries = json.load(cache_file)
+            except (OSError, ValueError) as error:
+                logging.warning(f"Cache {path} illisible, il sera recréé: {error}")
+
+    def get(self, url: str, max_age: float | None = None) -> dict[str, str] | None:
+        """
+        :param max_age: Âge maximal de l'entrée (défaut : ttl)
+        :return: Les champs de la page, ou None s'ils sont absents ou périmés
+        """
+        with self.lock:
+            entry: dict | None = self.entries.get(url)
+        if entry is None or time.time() - entry['fetched_at'] > (self.ttl if max_age is None else max_age):
+            return None
+        return entry['fields']
+
+    def set(self, url: str, fields: dict[str, str]) -> None:
+        with self.lock:
+            self.entries[url] = {'fetched_at': time.time(), 'fields': fields}
+
+    def save(self) -> None:
+        now: float = time.time()
+        with self.lock:
+            entries: list[tuple[str, dict]] = sorted(
+                ((url, entry) for url, entry in self.entries.items() if now - entry['fetched_at'] <= self.ttl),
+                key=lambda item: item[1]['fetched_at'], reverse=True)
+            self.entries = dict(entries[:self.max_entries])
+            with open(self.path, 'w') as cache_file:
+                json.dump(self.entries, cache_file)
+
+
+class DetailFetcher:
+    """
+    Enrichissement des sorties (--enrich) par leurs pages info-sortie.php. Seules les pages
+    absentes du cache ou périmées sont téléchargées, au plus DETAIL_WORKERS à la fois
+    (ou sur le pool donné, partagé entre clubs). Si une page ne peut pas être lue, la dernière
+    version en cache est utilisée, même périmée.
+    """
+
+    def __init__(self, cache: DetailCache, session: requests.Session | None = None, pool=None):
+        self.cache: DetailCache = cache
+        self.session: requests.Session | None = session
+        self.executor: ThreadPoolExecutor | None = (ThreadPoolExecutor(max_workers=DETAIL_WORKERS)
+                                                    if pool is None else None)
+        self.pool = self.executor if pool is None else pool
+
+    def _fetch(self, url: str) -> dict[str, str]:
+        http = requests if self.session is None else self.session
+        response: requests.Response = http.get(url)
+        response.raise_for_status()
+        fields: dict[str, str] = parse_detail(response.content)
+        self.cache.set(url, fields)
+        return fields
+
+    def enrich(self, act: 'Activity') -> list[Sortie]:
+        """
+        :return: Les sorties de l'activité, complétées par leurs pages info-sortie.php
+        """
+        with act.metrics.measure('activity', act.name, 'enrich'):
+            details: dict[str, dict[str, str]] = {}
+            fetches: dict[str, Future] = {}
+            for sortie in act.events:
+                fields: dict[str, str] | None = self.cache.get(sortie.url)
+                if fields is not None:
+                    details[sortie.url] = fields
+                elif sortie.url not in fetches:
+                    fetches[sortie.url] = self.pool.submit(self._fetch, sortie.url)
+            act.metrics.count('activity', act.name, 'details_cached', len(details))
+            for url, fetch in fetches.items():
+                try:
+                    details[url] = fetch.result()
+                except requests.RequestException as error:
+                    logging.warning(f"Page {url} non lue: {error}")
+                    fields = self.cache.get(url, max_age=float('inf'))
+                    if fields is not None:
+                        details[url] = fields
+            act.metrics.count('activity', act.name, 'details_fetched', len(fetches))
+            sorties: list[Sortie] = []
+            for sortie in act.events:
+                try:
+                    sorties.append(apply_details(sortie, details[sortie.url]) if sortie.url in details else sortie)
+                except ValueError as error:
+                    # Champ illisible (heure invalide...) : la sortie n'est pas enrichie
+                    logging.warning(f"Page {sortie.url} ignorée: {error}")
+                    sorties.append(sortie)
+            return sorties
+
+    def save(self) -> None:
+        self.cache.save()
+
+    def shutdown(self) -> None:
+        if self.executor is not None:
+            self.executor.shutdown()
 
 
 class Activity:
-    def __init__(self, name: str, asvette_id: int, calendar_id: str):
+    def __init__(self, name: str, asvette_id: int, calendar_id: str, cache: PageCache | None = None,
+                 session: requests.Session | None = None, metrics: RunMetrics | None = None,
+                 url_base: str = URL, sortie_base: str = URL_SORTIE_BASE,
+                 details: DetailFetcher | None = None):
         self.name: str = name
         self.id: int = asvette_id
         self.cal_id: str = calendar_id
-        self.url: str = URL + str(self.id)  # URL pour ASVETTE
-        self.table = self._get_html_table()
-        self.events: pd.DataFrame = self._get_events()
-        self.nb_events: int = self.events.shape[0]
-        self.is_events_empty: bool = self.events.empty
-
-    def get_row_dict(self, row_id: int) -> dict:
-        """
-        Cette fonction transforme un dictionnaire représentant une sortie ASVETTE
-        en un dictionnaire correspondant à l'API Google Calendar.
-        :param row_id: Index dans le Dataframe des sorties
-        :return: dictionnaire représentant la sortie ASVETTE en format Google Calendar
-        :rtype: dict
-        """
-        row: pd.Series = self.events.iloc[row_id]
-        s_date: str = row[SD_str]
-        e_date: str = row[ED_str]
-        s_time: str = row[ST_str]
-        e_time: str = row[ET_str]
-        if row[ADE_str] == 'TRUE':
-            start: str = r"{" + f"'date': '{s_date}', 'timeZone': 'Europe/Paris'" + r"}"
-            end: str = r"{" + f"'date': '{e_date}', 'timeZone': 'Europe/Paris'" + r"}"
-        else:
-            start = r"{" + f"'dateTime': '{s_date}T{s_time}', 'timeZone': 'Europe/Paris'" + r"}"
-            end = r"{" + f"'dateTime': '{e_date}T{e_time}', 'timeZone': 'Europe/Paris'" + r"}"
-        asvette_id: int = int(row['Id'].split('id')[-1])
-        url: str = URL_SORTIE_BASE + str(asvette_id)
-        source: str = r"{" + f"'title': 'ASVETTE', 'url': '{url}'" + r"}"
-        description: str = row['Description']
-        return_dict = {
-            'id': row['Id'],
-            'summary': row['Subject'],
-            'location': row['Location'],
-            'description': description,
-            'start': literal_eval(start),
-            'end': literal_eval(end),
-            'source': literal_eval(source),
-        }
-        return return_dict
+        self.url: str = url_base + str(self.id)  # URL pour ASVETTE
+        # URL des pages des sorties, sans leur id
+        self.sortie_base: str = sortie_base
+        self.cache: PageCache | None = cache
+        # Session HTTP partagée (connexions keep-alive vers ASVETTE)
+        self.session: requests.Session | None = session
+        self.metrics: RunMetrics = RunMetrics() if metrics is None else metrics
+        # Enrichissement facultatif par les pages des sorties (--enrich)
+        self.details: DetailFetcher | None = details
+        # Vrai si la page n'a pas changé depuis la dernière synchronisation
+        self.is_unchanged: bool = False
+        self.table: dict[str, list[str]] = self._get_html_table()
+        self.events: list[Sortie] = self._get_events()
+        if details is not None and self.events:
+            self.events = details.enrich(self)
+        self.nb_events: int = len(self.events)
+        self.is_events_empty: bool = not self.events
 
     @staticmethod
-    def _get_rows(table) -> pd.DataFrame | None:
-        # On récupère les en-têtes du tableau
-        headers: list = [header.text.strip() for header in table.find_all("th")]
-        rows: list = []
-        for row in table.find_all("tr"):
-            row_data: list = [cell.text.strip() for cell in row.find_all("td")]
-            if row_data:
-                rows.append(row_data)
-                # print(f"ASVETTE: {row_data[1]}, date: {row_data[3]}")
-        # On transforme le tableau en DataFrame
-        df: pd.DataFrame = pd.DataFrame(rows, columns=headers)
-        return df
+    def _get_rows(table: dict[str, list[str]]) -> list[dict[str, str]]:
+        # On transforme les colonnes du tableau en lignes {en-tête: valeur}
+        headers: list[str] = list(table)
+        return [dict(zip(headers, values)) for values in zip(*table.values())]
+
+    def _get_html_table(self) -> dict[str, list[str]]:
+        # Send a (conditional) GET request to the webpage.
+        # Avec --enrich, la liste est toujours relue : les pages des sorties périmées doivent
+        # être relues même si la liste n'a pas changé.
+        headers: dict[str, str] = ({} if self.cache is None or self.details is not None
+                                   else self.cache.get_headers(self.url))
+        http = requests if self.session is None else self.session
+        with self.metrics.measure('activity', self.name, 'fetch'):
+            response: requests.Response = http.get(self.url, headers=headers)
+        self.metrics.count('activity', self.name, 'bytes', len(response.content))
+        if self.cache is not None:
+            if response.status_code == 304:
+                self.is_unchanged = True
+                return {}
+            fingerprint: str = get_fingerprint(response.content)
+            if self.cache.is_unchanged(self.url, fingerprint) and self.details is None:
+                self.is_unchanged = True
+                return {}
+            self.cache.update(self.url, response, fingerprint)
+        # On récupère le tableau des sorties, colonne par colonne
+        with self.metrics.measure('activity', self.name, 'parse'):
+            table: dict[str, list[str]] = HTML_PARSERS[HTML_PARSER](response.content)
+        self.metrics.count('activity', self.name, 'rows', max(map(len, table.values()), default=0))
+        return table
+
+    def _get_events(self) -> list[Sortie]:
+        """
+        Cette fonction va rechercher la liste des sorties pour chaque activité sur ASVETTE et
+        les mettre en forme.
+        """
+        # On récupère les données du tableau
+        with self.metrics.measure('activity', self.name, 'transform'):
+            return self._transform(self._get_rows(self.table), self.id, self.sortie_base)
 
     @staticmethod
-    def _parse_time(x):
-        if x == '':
-            return pd.NaT
-        else:
-            return pd.to_datetime(x, format='%H:%M')
+    def _parse_date(value: str) -> datetime.date:
+        """
+        Lit la date d'une sortie ('YYYY-MM-DD', ou 'DD/MM/YYYY').
+        """
+        try:
+            return datetime.date.fromisoformat(value)
+        except ValueError:
+            return datetime.datetime.strptime(value, '%d/%m/%Y').date()
+
+    @staticmethod
+    def _parse_time(value: str) -> datetime.time | None:
+        """
+        Lit l'heure de départ d'une sortie ('HH:MM'). None si pas d'heure de départ.
+        """
+        try:
+            return datetime.datetime.strptime(value, '%H:%M').time()
+        except ValueError:
+            return None
+
+    @staticmethod
+    def _transform(rows: list[dict[str, str]], asvette_id: int,
+                   sortie_base: str = URL_SORTIE_BASE) -> list[Sortie]:
+        """
+        Met en forme les lignes brutes du tableau des sorties ASVETTE.
+        :param rows: Lignes du tableau des sorties telles que renvoyées par _get_rows
+        :param asvette_id: Id ASVETTE de l'activité
+        :param sortie_base: URL des pages des sorties, sans leur id
+        :return: Les sorties mises en forme
+        """
+        id_prefix: str = EVENT_ID_PREFIX + str(asvette_id) + 'id'
+        sorties: list[Sortie] = []
+        for row in rows:
+            date: datetime.date = Activity._parse_date(row['Date'])
+            heure: datetime.time | None = Activity._parse_time(row['Heure'])
+            # On considère qu'une sortie dure la journée si pas d'heure de départ ou si le départ
+            # est avant 10h00.
+            all_day: bool = heure is None or heure.hour < 10
+            # On extrait le nombre de jours de la colonne 'Durée' (+1 jour si sortie journée)
+            days: int = int(row['Durée'].split(' ')[0]) - 1 + all_day
+            start_time: str = ''
+            end_time: str = ''
+            if heure is not None:
+                start: datetime.datetime = datetime.datetime.combine(date, heure)
+                start_time = start.strftime('%H:%M:%S')
+                # Ajoute TROIS heures à l'heure de début pour déterminer la fin si pas une sortie journée.
+                end_time = (start + datetime.timedelta(hours=3)).strftime('%H:%M:%S')
+            sorties.append(Sortie(
+                id=id_prefix + row['Id'],
+                subject=row['Nom'],
+                start_date=date.isoformat(),
+                start_time=start_time,
+                # On ajoute le nombre de jours pour créer la date de fin
+                end_date=(date + datetime.timedelta(days=days)).isoformat(),
+                end_time=end_time,
+                all_day=all_day,
+                # Description == Difficulté + Encadrant + URL d'inscription
+                description=(row['Difficulté'] + ' | ' + row['Encadrant'] + '<BR><a href="' +
+                             sortie_base + row['Id'] + '">Inscription</a>'),
+                location=row['Lieu'],
+                url=sortie_base + str(int(row['Id'])),
+            ))
+        return sorties
+
+
+def _ics_text(value: str) -> str:
+    """
+    Échappe une valeur texte iCalendar (RFC 5545).
+    """
+    return value.replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,').replace('\n', '\\n')
+
 
-    def _get_html_table(self):
-        # Send a GET request to the webpage
-        response: requests.Response = requests.get(self.url)
-        # Create a BeautifulSoup object from the response content
-        soup: BeautifulSoup = BeautifulSoup(response.content, "html.parser")
+def _ics_line(line: str) -> str:
+    """
+    Retourne une ligne iCalendar pliée à 75 octets (les suites commencent par une espace).
+    """
+    encoded: bytes = line.encode('utf-8')
+    chunks: list[bytes] = []
+    limit: int = 75
+    while len(encoded) > limit:
+        cut: int = limit
+        # On ne coupe pas au milieu d'un caractère UTF-8
+        while encoded[cut] & 0xC0 == 0x80:
+            cut -= 1
+        chunks.append(encoded[:cut])
+        encoded = encoded[cut:]
+        limit = 74
+    chunks.append(encoded)
+    return b'\r\n '.join(chunks).decode('utf-8') + '\r\n'
+
+
+def _plain_text(description: str) -> str:
+    """
+    Met la description d'une sortie (HTML) en texte : lien d'inscription et retours à la ligne.
+    """
+    text: str = re.sub(r'<a href="([^"]*)">([^<]*)</a>', r'\2 : \1', description.replace('<BR>', '\n'))
+    return re.sub(r'<[^>]+>', '', text)
+
+
+class FeedSink:
+    """
+    Sortie des sorties ASVETTE sous forme de fichiers, à la place des écritures par l'API :
+    un flux iCalendar par calendrier Google (<calendrier>.ics), auquel un agenda peut s'abonner,
+    et éventuellement un fichier CSV à importer dans Google Agenda (<calendrier>.csv).
+    Les fichiers sont écrits au fil des sorties, et ne sont régénérés que si l'empreinte
+    de leur contenu a changé (empreintes dans feeds.json).
+    """
 
-        # On récupère le tableau des sorties
-        return soup.find("table", {"id": "table_sortie"})
+    def __init__(self, directory: str, with_csv: bool = False, metrics: RunMetrics | None = None):
+        self.directory: str = directory
+        self.with_csv: bool = with_csv
+        self.metrics: RunMetrics = RunMetrics() if metrics is None else metrics
+        self.lock: threading.Lock = threading.Lock()
+        self.manifest: dict[str, str] = {}
+        os.makedirs(directory, exist_ok=True)
+        manifest_path: str = os.path.join(directory, FEED_MANIFEST)
+        if os.path.exists(manifest_path):
+            try:
+                with open(manifest_path) as manifest_file:
+                    self.manifest = json.load(manifest_file)
+            except (OSError, ValueError) as error:
+                logging.warning(f"Fichier {manifest_path} illisible, les flux seront régénérés: {error}")
+
+    def get_path(self, calendar_id: str, extension: str) -> str:
+        return os.path.join(self.directory, calendar_id.split('@')[0] + extension)
 
-    def _get_events(self) -> pd.DataFrame:
+    @staticmethod
+    def get_hash(name: str, sorties: list[Sortie]) -> str:
         """
-        Cette fonction va rechercher la liste des sorties pour chaque activité sur ASVETTE et mettre
-        les informations dans un DataFrame.
-        Si le dataframe est vide, on le retourne directement.
-        S'il y a des sorties, on met en forme le Dataframe et on le retourne.
+        Retourne l'empreinte (SHA-256) du contenu d'un flux.
         """
-        # On récupère les données du tableau
-        df: pd.DataFrame = self._get_rows(self.table)
-        if df.empty:
-            return df
-        # On transforme la colonne 'Date' en datetime
-        df['Date'] = pd.to_datetime(df['Date'])
-        # On transforme la colonne 'Départ' en datetime
-        df['Heure'] = df['Heure'].apply(self._parse_time)
-        df['Heure'] = pd.to_datetime(df['Heure'], format='%H:%M:%S', errors='coerce').dt.time
-
-        first_char: str = 'Durée_first_char'
-        # On extrait le nombre de jours de la colonne 'Durée'
-        df[first_char] = df['Durée'].apply(lambda x: int(x.split(' ')[0]) - 1)
-        # On ajoute une colonne 'Description' == à Difficulté + Encadrant + URL d'inscription
-        df['Description'] = (df['Difficulté'] + ' | ' + df['Encadrant'] + '<BR><a href="' +
-                             URL_SORTIE_BASE + df['Id'] + '">Inscription</a>')
-
-        # On ajoute deux colonnes pour le bon format du CSV
-        df[ET_str] = ''
-        df['Private'] = ''
-        # Ajoute TROIS heures à l'heure de début pour déterminer la fin si pas une sortie journée.
-        df[ET_str] = df.apply(
-            lambda x: (datetime.datetime.combine(datetime.date.today(), x['Heure'])
-                       + datetime.timedelta(hours=3)).time()
-            if not pd.isnull(x['Heure']) else '', axis=1)
-
-        # On considère qu'une sortie dure la journée si pas d'heure de départ ou si le départ
-        # est avant 10h00.
-        df[ADE_str] = df['Heure'].apply(
-            lambda x: 'TRUE' if pd.isnull(x) or x < pd.to_datetime('10:00:00').time() else 'FALSE')
-
-        # On ajoute le nombre de jours pour créer la colonne 'End Date'
-        df[ED_str] = df.apply(lambda ligne: ligne['Date'] +
-                                            pd.DateOffset(
-                                                days=ligne[first_char] + 1 if ligne[ADE_str] == 'TRUE' else ligne[
-                                                    first_char]), axis=1)
-        # On supprime la colonne 'Durée_first_char', plus besoin.
-        df = df.drop(first_char, axis=1)
-        df['Date'] = df['Date'].dt.strftime('%Y-%m-%d')
-        df[ED_str] = df[ED_str].dt.strftime('%Y-%m-%d')
-
-        df['Heure'] = df['Heure'].apply(
-            lambda x: x.strftime('%H:%M:%S') if not pd.isnull(x) else '')
-        df[ET_str] = df[ET_str].apply(lambda x: x.strftime('%H:%M:%S') if x else '')
-        # On renomme les colonnes pour correspondre au format du fichier csv
-        df = df.rename(columns={'Nom': 'Subject', 'Date': SD_str, 'Heure': ST_str,
-                                'Lieu': 'Location'})
-        df = df[['Id', 'Subject', SD_str, ST_str, ED_str, ET_str, ADE_str,
-                 'Description', 'Location', 'Private']]
-        df['Id'] = df['Id'].apply(lambda x: 'asvette' + 'act' + str(self.id) + 'id' + str(x))
-        return df
+        content_hash = hashlib.sha256(name.encode())
+        for sortie in sorties:
+            content_hash.update(json.dumps(dataclasses.astuple(sortie)).encode())
+        return content_hash.hexdigest()
+
+    def write(self, calendar_id: str, name: str, activities: list['Activity']) -> str:
+        """
+        Écrit le flux d'un calendrier à partir des sorties de ses activités, s'il a changé.
+        :return: Le résultat de l'opération
+        """
+        sorties: list[Sortie] = sorted((sortie for act in activities for sortie in act.events),
+                                       key=lambda sortie: (sortie.start_date, sortie.start_time, sortie.id))
+        content_hash: str = self.get_hash(name, sorties)
+        paths: list[str] = [self.get_path(calendar_id, '.ics')]
+        if self.with_csv:
+            paths.append(self.get_path(calendar_id, '.csv'))
+        with self.lock:
+            unchanged: bool = self.manifest.get(calendar_id) == content_hash
+        if unchanged and all(os.path.exists(path) for path in paths):
+            return f"Flux {name}: {len(sorties)} sorties, inchangé"
+        with self.metrics.measure('calendar', name, 'feed'):
+            self._write_ics(paths[0], name, sorties)
+            if self.with_csv:
+                self._write_csv(paths[1], sorties)
+        self.metrics.count('calendar', name, 'feed_sorties', len(sorties))
+        with self.lock:
+            self.manifest[calendar_id] = content_hash
+        return f"Flux {name}: {len(sorties)} sorties, régénéré"
+
+    @staticmethod
+    def _write_ics(path: str, name: str, sorties: list[Sortie]) -> None:
+        stamp: str = datetime.datetime.now(datetime.timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+        with open(path + '.tmp', 'w', encoding='utf-8', newline='') as ics_file:
+            for line in ['BEGIN:VCALENDAR', 'VERSION:2.0', 'PRODID:-//ASVEL Ski Montagne//asvette2google//FR',
+                         'CALSCALE:GREGORIAN', 'METHOD:PUBLISH', f'X-WR-CALNAME:{_ics_text(name)}',
+                         'X-WR-TIMEZONE:Europe/Paris'] + ICS_TIMEZONE:
+                ics_file.write(_ics_line(line))
+            for sortie in sorties:
+                if sortie.all_day:
+                    start: str = 'DTSTART;VALUE=DATE:' + sortie.start_date.replace('-', '')
+                    end: str = 'DTEND;VALUE=DATE:' + sortie.end_date.replace('-', '')
+                else:
+                    start = (f"DTSTART;TZID=Europe/Paris:{sortie.start_date.replace('-', '')}"
+                             f"T{sortie.start_time.replace(':', '')}")
+                    end = (f"DTEND;TZID=Europe/Paris:{sortie.end_date.replace('-', '')}"
+                           f"T{sortie.end_time.replace(':', '')}")
+                for line in ['BEGIN:VEVENT', f'UID:{sortie.id}@asvette', f'DTSTAMP:{stamp}', start, end,
+                             f'SUMMARY:{_ics_text(sortie.subject)}', f'LOCATION:{_ics_text(sortie.location)}',
+                             f'DESCRIPTION:{_ics_text(_plain_text(sortie.description))}',
+                             f'URL:{sortie.url}', 'END:VEVENT']:
+                    ics_file.write(_ics_line(line))
+            ics_file.write(_ics_line('END:VCALENDAR'))
+        os.replace(path + '.tmp', path)
+
+    @staticmethod
+    def _write_csv(path: str, sorties: list[Sortie]) -> None:
+        with open(path + '.tmp', 'w', encoding='utf-8', newline='') as csv_file:
+            writer = csv.writer(csv_file)
+            writer.writerow(CSV_COLUMNS)
+            for sortie in sorties:
+                start: datetime.date = datetime.date.fromisoformat(sortie.start_date)
+                end: datetime.date = datetime.date.fromisoformat(sortie.end_date)
+                if sortie.all_day:
+                    # Dans le CSV, le dernier jour d'une sortie journée est inclus
+                    end -= datetime.timedelta(days=1)
+                writer.writerow([
+                    sortie.subject, start.strftime('%m/%d/%Y'),
+                    '' if sortie.all_day else datetime.time.fromisoformat(sortie.start_time).strftime('%I:%M %p'),
+                    end.strftime('%m/%d/%Y'),
+                    '' if sortie.all_day else datetime.time.fromisoformat(sortie.end_time).strftime('%I:%M %p'),
+                    'True' if sortie.all_day else 'False',
+                    _plain_text(sortie.description), sortie.location, 'False'])
+        os.replace(path + '.tmp', path)
+
+    def save(self) -> None:
+        with open(os.path.join(self.directory, FEED_MANIFEST), 'w') as manifest_file:
+            json.dump(self.manifest, manifest_file, indent=2)
+
+
+class StartupReport:
+    """
+    Durées des étapes du démarrage (arguments, credentials, service Google...) depuis la fin
+    du chargement du module, affichées avec --startup-report. La durée des imports se mesure
+    avec python -X importtime.
+    """
+
+    def __init__(self, enabled: bool):
+        self.enabled: bool = enabled
+        self.steps: list[tuple[str, float]] = []
+        self.last: float = MODULE_LOADED
+
+    def step(self, name: str) -> None:
+        """
+        Enregistre la durée de l'étape name, terminée à l'instant.
+        """
+        now: float = time.perf_counter()
+        self.steps.append((name, now - self.last))
+        self.last = now
+
+    def print(self) -> None:
+        if not self.enabled:
+            return
+        for name, duration in self.steps:
+            print(f"{name:<12} {duration * 1000:8.1f} ms")
+        print(f"{'total':<12} {(self.last - MODULE_LOADED) * 1000:8.1f} ms")
+
+
+class Profiler:
+    """
+    Mode --profile : exécute une synchronisation sous cProfile, dans tous les threads
+    (jusqu'à Python 3.11, un profileur par thread, fusionnés à la fin ; depuis Python 3.12,
+    un seul profileur suit tous les threads), et éventuellement sous tracemalloc.
+    Écrit dans le dossier choisi :
+    - asvette.pstats : les statistiques complètes (python -m pstats, snakeviz...) ;
+    - asvette_top.txt : les fonctions les plus coûteuses (temps cumulé, puis temps propre) ;
+    - asvette_memory.txt : le pic de mémoire et les lignes qui allouent le plus (--profile-memory).
+    Les pics de mémoire par phase sont dans le rapport de synchronisation (memory_peak).
+    """
+
+    def __init__(self, directory: str, top: int = PROFILE_TOP, memory: bool = False):
+        self.directory: str = directory
+        self.top: int = top
+        self.memory: bool = memory
+        self.lock: threading.Lock = threading.Lock()
+        self.profiles: list[cProfile.Profile] = []
+
+    def _start_thread(self, frame, event: str, arg) -> None:
+        # Premier événement d'un nouveau thread : on y active un profileur dédié
+        sys.setprofile(None)
+        profile: cProfile.Profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError as error:
+            # Un autre profileur est déjà actif : le thread s'exécute sans profileur dédié
+            logging.warning(f"Thread non profilé: {error}")
+            return
+        with self.lock:
+            self.profiles.append(profile)
+
+    def run(self, func, *args):
+        """
+        Exécute func(*args) sous le profileur, puis écrit les résultats.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        if self.memory:
+            tracemalloc.start()
+        profile: cProfile.Profile = cProfile.Profile()
+        self.profiles.append(profile)
+        # Depuis Python 3.12 (sys.monitoring), un profileur couvre déjà tous les threads
+        per_thread: bool = sys.version_info < (3, 12)
+        if per_thread:
+            threading.setprofile(self._start_thread)
+        profile.enable()
+        try:
+            return func(*args)
+        finally:
+            profile.disable()
+            if per_thread:
+                threading.setprofile(None)
+            self.save()
+
+    def save(self) -> None:
+        stats: pstats.Stats = pstats.Stats(*self.profiles)
+        stats.dump_stats(os.path.join(self.directory, 'asvette.pstats'))
+        with open(os.path.join(self.directory, 'asvette_top.txt'), 'w') as top_file:
+            stats.stream = top_file
+            stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(self.top)
+            stats.sort_stats(pstats.SortKey.TIME).print_stats(self.top)
+        if self.memory:
+            snapshot: tracemalloc.Snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            with open(os.path.join(self.directory, 'asvette_memory.txt'), 'w') as memory_file:
+                memory_file.write(f"Mémoire allouée : {current / 1024:.0f} Kio, pic : {peak / 1024:.0f} Kio\n\n")
+                for statistic in snapshot.statistics('lineno')[:self.top]:
+                    memory_file.write(f"{statistic}\n")
+        logging.info(f"Profil écrit dans {self.directory}")
 
 
 def timer(func):
@@ -400,22 +2198,24 @@ def timer(func):
     return wrapper
 
 
-def get_credentials(zap: Zap):
+def get_credentials(zap: Zap, token_path: str = TOKEN, credentials_path: str = CREDENTIALS):
     """
     Retourne les credentials pour accéder aux APIs Google.
 
     Les credentials sont stockés dans un fichier token.json. Si le fichier n'existe pas,
     le programme lance le flux d'authentification et stocke les credentials dans le fichier
     token.json.
+
+    :param token_path: Chemin du token (token.json)
+    :param credentials_path: Chemin du fichier client OAuth (credentials.json)
     """
     creds = None
-    cred_file: str = os.path.join(SCRIPT_PATH, 'credentials.json')
     # The file token.json stores the user's access and refresh tokens, and is
     # created automatically when the authorization flow completes for the first
     # time.
-    if os.path.exists(TOKEN):
+    if os.path.exists(token_path):
         try:
-            creds = Credentials.from_authorized_user_file(TOKEN, SCOPES)
+            creds = Credentials.from_authorized_user_file(token_path, SCOPES)
         except RefreshError:
             msg: str = "Le token est invalide. Il faudra se reconnecter."
             logging.warning(msg)
@@ -430,122 +2230,710 @@ def get_credentials(zap: Zap):
         if creds and creds.expired and creds.refresh_token:
             creds.refresh(Request())
         else:
+            # Connexion interactive : seul cas où le flux OAuth est nécessaire
+            from google_auth_oauthlib.flow import InstalledAppFlow
             flow = InstalledAppFlow.from_client_secrets_file(
-                cred_file, SCOPES
+                credentials_path, SCOPES
             )
             creds = flow.run_local_server(port=0)
         # Save the credentials for the next run
-        with open(TOKEN, "w") as token:
+        with open(token_path, "w") as token:
             token.write(creds.to_json())
     return creds
 
 
-def get_service(creds: Credentials):
+def refresh_credentials(creds: Credentials, token_path: str = TOKEN) -> None:
+    """
+    Rafraîchit le jeton d'accès s'il a expiré et l'enregistre dans token.json.
+    Utilisé par le mode démon, qui garde les credentials en mémoire.
+    """
+    if creds.expired and creds.refresh_token:
+        creds.refresh(Request())
+        with open(token_path, "w") as token:
+            token.write(creds.to_json())
+
+
+def get_discovery_document() -> str | None:
+    """
+    Retourne le document de découverte de l'API Google Calendar v3, depuis la copie locale
+    (DISCOVERY_CACHE). Au premier appel, la copie est créée à partir du document fourni
+    avec googleapiclient.
+    :return: Le document (JSON), ou None s'il n'est pas disponible localement
+    """
+    if os.path.exists(DISCOVERY_CACHE):
+        with open(DISCOVERY_CACHE) as discovery_file:
+            return discovery_file.read()
+    from googleapiclient.discovery_cache import get_static_doc
+    document: str | None = get_static_doc("calendar", "v3")
+    if document is not None:
+        with open(DISCOVERY_CACHE, "w") as discovery_file:
+            discovery_file.write(document)
+    return document
+
+
+# Connexions HTTP (keep-alive) vers l'API Google, une par thread, partagées par tous les services
+_GOOGLE_HTTP: threading.local = threading.local()
+
+
+def get_http() -> httplib2.Http:
+    """
+    Retourne la connexion HTTP du thread courant vers l'API Google.
+    httplib2 n'est pas thread-safe : chaque thread a la sienne, mais les services de tous
+    les clubs (--config) la partagent.
+    """
+    if not hasattr(_GOOGLE_HTTP, 'http'):
+        _GOOGLE_HTTP.http = httplib2.Http()
+    return _GOOGLE_HTTP.http
+
+
+def get_service(creds: Credentials, root_url: str | None = None):
     """
     Retourne le service de Google Calendar.
+    Le service est construit à partir de la copie locale du document de découverte.
 
     :param creds: Credentials pour accéder aux APIs Google
     :type creds: Credentials
+    :param root_url: Racine d'une API de substitution (émulateur), à la place de celle de Google
     :return: Service de Google Calendar
     :rtype: Service
     """
+    import google_auth_httplib2
+    from googleapiclient.discovery import build, build_from_document
+    from googleapiclient.http import HttpRequest
+    local: threading.local = threading.local()
+
+    def build_request(http, *args, **kwargs) -> HttpRequest:
+        # Les credentials sont propres au service, la connexion est celle du thread (get_http)
+        if not hasattr(local, 'http'):
+            local.http = google_auth_httplib2.AuthorizedHttp(creds, http=get_http())
+        return HttpRequest(local.http, *args, **kwargs)
+
+    http = google_auth_httplib2.AuthorizedHttp(creds, http=httplib2.Http())
     try:
-        service = build("calendar", "v3", credentials=creds)
+        document: str | None = get_discovery_document()
+        if document is None:
+            service = build("calendar", "v3", requestBuilder=build_request, http=http)
+        elif root_url is None:
+            service = build_from_document(document, requestBuilder=build_request, http=http)
+        else:
+            # Les requêtes, y compris les lots (batchPath), partent de rootUrl
+            description: dict = json.loads(document)
+            description['rootUrl'] = root_url.rstrip('/') + '/'
+            description['baseUrl'] = description['rootUrl'] + description['servicePath']
+            service = build_from_document(description, requestBuilder=build_request, http=http)
     except HttpError as error:
         logging.error(f"Une erreur s'est produite: {error}")
         sys.exit(1)
     return service
 
 
-def diff_asvette_google(asv_dict: dict, google_dict: dict) -> bool:
+def diff_asvette_google(sortie: Sortie, google_event: CalendarEvent) -> dict[str, tuple[str, str]]:
     """
-    Check if an ASVETTE event is different from a Google Calendar event.
+    Compare an ASVETTE sortie with a Google Calendar event, field by field.
 
     Parameters:
-    asv_dict (dict): The dictionary representing the ASVETTE event
-    google_dict (dict): The dictionary representing the Google Calendar event
+    sortie (Sortie): The ASVETTE sortie
+    google_event (CalendarEvent): The Google Calendar event, in the ASVETTE format
 
     Returns:
-    bool: True if there is a difference between the two events, False otherwise
+    dict: {field: (ASVETTE value, Google value)} for each field that differs, empty if identical
+    """
+    # Une sortie à la journée n'est envoyée qu'avec ses dates : ses heures ne sont pas comparées
+    ignored: tuple[str, ...] = ('start_time', 'end_time') if sortie.all_day and google_event.all_day else ()
+    return {field: (getattr(sortie, field), getattr(google_event, field)) for field in SORTIE_FIELDS
+            if field not in ignored and getattr(sortie, field) != getattr(google_event, field)}
+
+
+class ChangeSet:
+    """
+    Résultat de la comparaison entre les sorties ASVETTE d'une activité et le calendrier Google.
+    Les sorties sont repérées par leur position dans la liste des sorties de l'activité.
     """
-    log_line: str = asv_dict['Subject']
-    nb_diff: int = 0
-    for key, valeur in asv_dict.items():
-        # Si la valeur ASVETTE est différente de la valeur dans le calendrier
-        if valeur != google_dict[key]:
-            log_line += f' | {key}: {valeur} != {google_dict[key]}'
-            nb_diff += 1
-    logging.info(log_line)
-    return True if nb_diff > 0 else False
+
+    def __init__(self):
+        self.identical: list[int] = []
+        # position -> {champ: (valeur ASVETTE, valeur Google)}
+        self.changed: dict[int, dict[str, tuple[str, str]]] = {}
+        self.new: list[int] = []
+        # Identiques, mais l'événement Google n'a pas encore d'empreinte : on la lui ajoute
+        self.legacy: list[int] = []
+
+
+def get_changes(act: Activity, cal: GoogleCalendar, positions: list[int] | None = None,
+                events: list[dict] | None = None) -> ChangeSet:
+    """
+    Classe les sorties ASVETTE en identiques, modifiées ou nouvelles, en une seule passe.
+    Les événements Google sont indexés par Id : le coût est linéaire en nombre de sorties.
+    Si l'événement Google porte une empreinte, une seule comparaison suffit. Sinon,
+    les champs sont comparés un à un.
+
+    Parameters :
+    act (Activity) : Une activité ASVETTE avec ses sorties.
+    cal (GoogleCalendar) : Les événements Google Calendar correspondants à l'activité.
+    positions (list[int]) : Positions des sorties à comparer (par défaut toutes).
+    events (list[dict]) : Les sorties au format Google (Sortie.to_event), si déjà calculées.
+
+    Returns :
+    ChangeSet : Les sorties classées, avec le détail des champs modifiés.
+    """
+    changes: ChangeSet = ChangeSet()
+    for pos in range(act.nb_events) if positions is None else positions:
+        sortie: Sortie = act.events[pos]
+        google_event: CalendarEvent | None = cal.events.get(sortie.id)
+        if google_event is None:
+            changes.new.append(pos)
+            continue
+        event: dict = sortie.to_event() if events is None else events[pos]
+        asv_hash: str = event['extendedProperties']['private'][HASH_KEY]
+        if google_event.content_hash:
+            diff: dict[str, tuple[str, str]] = (
+                {} if google_event.content_hash == asv_hash
+                else {'content_hash': (asv_hash, google_event.content_hash)})
+        else:
+            diff = diff_asvette_google(sortie, google_event)
+            if not diff:
+                changes.legacy.append(pos)
+                continue
+        if diff:
+            changes.changed[pos] = diff
+            logging.info(sortie.subject + ''.join(f' | {key}: {asv} != {google}'
+                                                  for key, (asv, google) in diff.items()))
+        else:
+            changes.identical.append(pos)
+    return changes
 
 
-def check_events(act: Activity, cal: GoogleCalendar) -> str:
+def check_events(act: Activity, calendars: CalendarRegistry, state: StateStore | None = None,
+                 metrics: RunMetrics | None = None) -> tuple[str, int, int]:
     """
     Vérifie si les événements d'une activité ASVETTE sont présents sur un calendrier Google.
     Si un événement n'est pas présent, il est ajouté.
     Si un événement est présent, mais différent, il est mis à jour.
-    Retourne un tuple contenant :
-    - Le nombre d'événements identiques.
-    - Le nombre d'événements différents.
-    - Le nombre d'événements absents du calendrier Google.
+    Les ajouts et mises à jour sont regroupés dans un plan envoyé par lots (API batch).
+    Les sorties inchangées depuis la dernière synchronisation (état local) ne sont pas
+    vérifiées sur Google. Si toutes le sont, le calendrier Google n'est pas lu.
 
     Parameters :
     act (Activity) : Une activité ASVETTE avec ses sorties.
-    cal (GoogleCalendar) : Les événements Google Calendar correspondants é l'activité.
+    calendars (CalendarRegistry) : Les calendriers Google partagés.
+    state (StateStore) : L'état local des sorties synchronisées.
+    metrics (RunMetrics) : Les mesures de la synchronisation.
 
     Returns :
-    str : Le résultat de l'opération avec le nombre de sorties inchangées, ajoutées et mises à jour.
-    """
-    nb_identical: int = 0
-    nb_different: int = 0
-    nb_absentes: int = 0
-    for index, row in act.events.iterrows():
-        event: dict = act.get_row_dict(int(str(index)))
-        # Si la sortie (id) n'est pas dans le calendrier, on l'ajoute
-        if cal.events is None or row['Id'] not in cal.events['Id'].values:
-            nb_absentes += 1
-            cal.add_event(event)  # ajoute 1 événement et imprime le résultat de l'opération.
-        # Si la sortie (id) est dans le calendrier, on compare les champs.
+    tuple[str, int, int] : Le résultat de l'opération avec le nombre de sorties inchangées, ajoutées,
+    mises à jour et en échec, le nombre de sorties ajoutées ou mises à jour, et le nombre
+    d'écritures en échec.
+
+    Raises :
+    LeaseLostError : Si le bail des calendriers a été perdu avant l'envoi des écritures.
+    """
+    metrics = RunMetrics() if metrics is None else metrics
+    with metrics.measure('activity', act.name, 'diff'):
+        events: list[dict] = [sortie.to_event() for sortie in act.events]
+        known: dict[str, str] = {} if state is None else state.get_digests(act.cal_id)
+        # Seules les sorties nouvelles ou modifiées depuis la dernière synchronisation sont vérifiées
+        positions: list[int] = [pos for pos, event in enumerate(events)
+                                if known.get(event['id']) != get_digest(event)]
+    nb_known: int = act.nb_events - len(positions)
+    changes: ChangeSet = ChangeSet()
+    outcomes: dict[str, str] = {}
+    if positions:
+        cal: GoogleCalendar = calendars.get(act.cal_id)
+        with metrics.measure('activity', act.name, 'diff'):
+            changes = get_changes(act, cal, positions, events)
+        # Empreinte différente : les champs sont comparés pour n'envoyer que ceux qui ont changé.
+        # Seuls les événements lus sans leur contenu (listing léger) sont relus ; si la relecture
+        # échoue, tout le contenu est envoyé.
+        mismatched: list[int] = [pos for pos, diff in changes.changed.items() if 'content_hash' in diff]
+        if mismatched:
+            light: list[str] = [events[pos]['id'] for pos in mismatched
+                                if not cal.events[events[pos]['id']].start_date]
+            if light:
+                cal.load_events(light)
+            for pos in mismatched:
+                google_event: CalendarEvent = cal.events[events[pos]['id']]
+                if google_event.start_date:
+                    # Champs identiques : seule l'empreinte est mise à jour
+                    changes.changed[pos] = diff_asvette_google(act.events[pos], google_event)
+        if state is not None:
+            for pos in changes.identical:
+                state.record(cal.id, events[pos], cal.etags.get(events[pos]['id']))
+        # Les sorties modifiées ne reçoivent que les champs qui ont changé (PATCH)
+        patches: list[tuple[dict, tuple[str, ...]]] = [(events[pos], tuple(diff))
+                                                       for pos, diff in changes.changed.items()]
+        patches += [(events[pos], ()) for pos in changes.legacy]
+        plan: dict[str, list] = {'insert': [events[pos] for pos in changes.new], 'patch': patches}
+        # Une autre exécution écrit peut-être déjà dans ce calendrier
+        calendars.check_lease(cal.id)
+        with metrics.measure('activity', act.name, 'write'):
+            outcomes = cal.execute_plan(plan)
+    # Seules les écritures réussies sont comptées
+    nb_updated: int = sum(outcomes.get(events[pos]['id']) not in (None, 'failed') for pos in changes.changed)
+    nb_inserted: int = sum(outcomes.get(events[pos]['id']) not in (None, 'failed') for pos in changes.new)
+    nb_failed: int = sum(outcome == 'failed' for outcome in outcomes.values())
+    metrics.count('activity', act.name, 'unchanged', nb_known + len(changes.identical) + len(changes.legacy))
+    metrics.count('activity', act.name, 'updated', nb_updated)
+    metrics.count('activity', act.name, 'inserted', nb_inserted)
+    metrics.count('activity', act.name, 'failed', nb_failed)
+    return ((f"{act.name}: {nb_known + len(changes.identical) + len(changes.legacy)} identiques | "
+             f"{nb_updated} mises à jour | {nb_inserted} créées | {nb_failed} en échec"),
+            nb_updated + nb_inserted, nb_failed)
+
+
+def sync_calendar(fetches: list[Future], calendars: CalendarRegistry, state: StateStore,
+                  cache: PageCache | None, metrics: RunMetrics,
+                  written: dict[str, int] | None = None) -> dict[str, str]:
+    """
+    Synchronise un calendrier Google avec les activités ASVETTE qui y écrivent.
+    Les activités d'un même calendrier sont traitées l'une après l'autre : les écritures
+    dans un calendrier ne sont jamais concurrentes.
+
+    :param fetches: Les téléchargements (en cours) des activités du calendrier
+    :param calendars: Les calendriers Google partagés
+    :param state: L'état local des sorties synchronisées
+    :param cache: Le cache des pages ASVETTE
+    :param metrics: Les mesures de la synchronisation
+    :param written: Complété avec le nombre de sorties ajoutées ou mises à jour, par activité
+    :return: Le résultat de l'opération, par activité
+    """
+    activities: list[Activity] = [fetch.result() for fetch in fetches]
+    for act in activities:
+        calendars.add(act)
+    results: dict[str, str] = {}
+    for act in activities:
+        # Si la page ASVETTE n'a pas changé depuis la dernière synchronisation, rien à faire
+        if act.is_unchanged:
+            logging.info(f"Aucun changement pour {act.name}")
+            continue
+        # Si aucune sortie ASVETTE, Alors on passe à l'activité suivante
+        if act.is_events_empty:
+            logging.info(f"Aucune sortie {act.name} trouvée")
+            if cache is not None:
+                cache.commit(act.url)
+            continue
+        # On passe en revue la liste des sorties pour ajout ou mise à jour du calendrier.
+        # Le calendrier Google n'est lu que si des sorties ont changé depuis la dernière exécution.
+        results[act.name], nb_written, nb_failed = check_events(act, calendars, state, metrics)
+        if written is not None:
+            written[act.name] = nb_written
+        logging.info(results[act.name])
+        state.commit()
+        # La page n'est marquée comme synchronisée que si toutes les écritures ont réussi :
+        # sinon, la prochaine exécution reprend l'activité
+        if cache is not None and not nb_failed:
+            cache.commit(act.url)
+    return results
+
+
+def sync_activities(names: list[str], service, session: requests.Session, cache: PageCache | None,
+                    sync_store: SyncStore | None, state: StateStore,
+                    scheduler: ApiScheduler, metrics: RunMetrics, url_base: str = URL,
+                    activities: dict[str, dict] | None = None, sortie_base: str = URL_SORTIE_BASE,
+                    pools: tuple | None = None, details: DetailFetcher | None = None,
+                    lease: Lease | None = None, written: dict[str, int] | None = None) -> dict[str, str]:
+    """
+    Synchronise les activités données : les pages ASVETTE sont téléchargées en parallèle,
+    et chaque calendrier Google est synchronisé dès que ses activités sont disponibles.
+
+    :param names: Les activités à synchroniser (clés de activities)
+    :param url_base: URL des listes de sorties ASVETTE, sans l'id d'activité
+    :param activities: Les activités du club et leurs id ASVETTE / Google (défaut : ACTIVITIES)
+    :param sortie_base: URL des pages des sorties ASVETTE, sans leur id
+    :param pools: Pools (téléchargements, calendriers) partagés avec d'autres clubs. Par défaut,
+                  la synchronisation crée les siens.
+    :param details: Enrichissement des sorties par leurs pages ASVETTE (--enrich)
+    :param lease: Bail des calendriers, vérifié avant chaque envoi d'écritures
+    :param written: Complété avec le nombre de sorties ajoutées ou mises à jour, par activité
+    :return: Le résultat de l'opération, par activité synchronisée
+    :raise LeaseLostError: Si le bail a été perdu en cours de synchronisation
+    """
+    activities = ACTIVITIES if activities is None else activities
+    # Chaque calendrier Google n'est listé qu'une fois, même s'il est partagé par plusieurs activités
+    calendars: CalendarRegistry = CalendarRegistry(service, [], sync_store, state, scheduler, metrics, lease)
+    groups: dict[str, list[str]] = {}
+    for activity in names:
+        groups.setdefault(activities[activity]['google_id'], []).append(activity)
+    results: dict[str, str] = {}
+    with contextlib.ExitStack() as stack:
+        if pools is None:
+            pools = (stack.enter_context(ThreadPoolExecutor(max_workers=FETCH_WORKERS)),
+                     stack.enter_context(ThreadPoolExecutor(max_workers=CALENDAR_WORKERS)))
+        fetch_pool, calendar_pool = pools
+        # 1. Recherche des sorties pour chaque activité sur le site ASVETTE, en parallèle
+        fetches: dict[str, Future] = {
+            activity: fetch_pool.submit(Activity, activity, activities[activity]['asvette_id'],
+                                        activities[activity]['google_id'], cache, session, metrics, url_base,
+                                        sortie_base, details)
+            for activity in names}
+        # 2. Chaque calendrier est synchronisé dès que ses activités sont téléchargées
+        syncs: list[Future] = [
+            calendar_pool.submit(sync_calendar, [fetches[activity] for activity in group],
+                                 calendars, state, cache, metrics, written)
+            for group in groups.values()]
+        for sync in syncs:
+            results.update(sync.result())
+    return results
+
+
+def export_feeds(names: list[str], session: requests.Session, sink: FeedSink, metrics: RunMetrics,
+                 url_base: str = URL, sortie_base: str = URL_SORTIE_BASE,
+                 details: DetailFetcher | None = None) -> dict[str, str]:
+    """
+    Écrit les flux des activités données, un par calendrier Google, sans passer par l'API.
+    Les pages ASVETTE sont téléchargées en parallèle, sans le cache des pages : un flux
+    contient toutes les sorties de ses activités.
+
+    :param names: Les activités à exporter (clés de ACTIVITIES)
+    :return: Le résultat de l'opération, par calendrier
+    """
+    groups: dict[str, list[str]] = {}
+    for activity in names:
+        groups.setdefault(ACTIVITIES[activity]['google_id'], []).append(activity)
+    with ThreadPoolExecutor(max_workers=FETCH_WORKERS) as fetch_pool:
+        fetches: dict[str, Future] = {
+            activity: fetch_pool.submit(Activity, activity, ACTIVITIES[activity]['asvette_id'],
+                                        ACTIVITIES[activity]['google_id'], None, session, metrics, url_base,
+                                        sortie_base, details)
+            for activity in names}
+        results: dict[str, str] = {}
+        for calendar_id, activities in groups.items():
+            results[calendar_id] = sink.write(calendar_id, ', '.join(activities),
+                                              [fetches[activity].result() for activity in activities])
+            logging.info(results[calendar_id])
+    sink.save()
+    return results
+
+
+def finish_cycle(results: dict[str, str], zap: Zap, scheduler: ApiScheduler, state: StateStore,
+                 cache: PageCache | None, sync_store: SyncStore | None, metrics: RunMetrics,
+                 activities: dict[str, dict] | None = None, details: DetailFetcher | None = None) -> None:
+    """
+    Enregistre les caches et publie le résultat d'une synchronisation
+    (logs, rapport JSON, fichier Prometheus et Zapier).
+
+    :param activities: Les activités du club, dans l'ordre des résultats (défaut : ACTIVITIES)
+    :param details: Enrichissement des sorties (--enrich), dont le cache est enregistré
+    """
+    for activity in ACTIVITIES if activities is None else activities:
+        if activity in results:
+            zap.add(results[activity] + '\n')
+    logging.info(scheduler.get_summary())
+    zap.add(scheduler.get_summary() + '\n')
+    try:
+        zap.payload['metrics'] = json.dumps(metrics.export(scheduler), ensure_ascii=False)
+    except OSError as error:
+        logging.error(f"Le rapport de synchronisation n'a pas pu être écrit: {error}")
+    scheduler.reset()
+    metrics.reset()
+    for calendar_id, nb_events, synced_at in state.get_summary():
+        logging.info(f"État local {calendar_id}: {nb_events} sorties, dernière synchronisation {synced_at}")
+    state.commit()
+    if cache is not None:
+        cache.save()
+    if sync_store is not None:
+        sync_store.save()
+    if details is not None:
+        details.save()
+    if zap.webhook is not None:
+        zap.post()
+
+
+def run_daemon(args: CommandLineArguments, credentials: Credentials, service,
+               session: requests.Session, cache: PageCache | None, sync_store: SyncStore,
+               state: StateStore, scheduler: ApiScheduler, metrics: RunMetrics,
+               details: DetailFetcher | None = None, lease: Lease | None = None) -> None:
+    """
+    Mode démon : les credentials, le service Google, les sessions HTTP et les copies locales
+    des calendriers restent en mémoire. Chaque activité est scrutée à intervalle adaptatif :
+    POLL_MIN après un changement, puis doublé à chaque scrutation sans changement, jusqu'à POLL_MAX.
+    SIGTERM (ou SIGINT) arrête le démon à la fin du cycle en cours, de même que la perte
+    du bail des calendriers.
+    """
+    stop: threading.Event = threading.Event()
+
+    def handle_signal(signum: int, frame) -> None:
+        logging.info(f"Signal {signum} reçu, arrêt du démon...")
+        stop.set()
+
+    signal.signal(signal.SIGTERM, handle_signal)
+    signal.signal(signal.SIGINT, handle_signal)
+    intervals: dict[str, int] = dict.fromkeys(args.activities, POLL_MIN)
+    next_polls: dict[str, float] = dict.fromkeys(args.activities, 0.0)
+    while not stop.is_set():
+        if lease is not None and lease.is_lost:
+            logging.error("Bail perdu, arrêt du démon")
+            break
+        due: list[str] = [activity for activity, next_poll in next_polls.items()
+                          if next_poll <= time.monotonic()]
+        zap: Zap = Zap(args.webhook)
+        results: dict[str, str] = {}
+        # Nombre de sorties ajoutées ou mises à jour, par activité
+        written: dict[str, int] = {}
+        try:
+            refresh_credentials(credentials)
+            results = sync_activities(due, service, session, cache, sync_store, state, scheduler, metrics,
+                                      args.asvette_url, sortie_base=args.asvette_sortie_url, details=details,
+                                      lease=lease, written=written)
+        except RefreshError as error:
+            logging.error(f"Le token est invalide. Il faudra se reconnecter: {error}")
+            break
+        except LeaseLostError as error:
+            logging.error(error)
+            break
+        except ListingError as error:
+            # Google indisponible : le cycle est abandonné et les activités scrutées moins souvent
+            logging.error(error)
+        except Exception as error:
+            logging.exception(f"Une erreur s'est produite: {error}")
+        for activity in due:
+            # Une activité sans écriture (page inchangée ou sorties identiques) est scrutée
+            # de moins en moins souvent
+            intervals[activity] = (POLL_MIN if written.get(activity, 0) > 0
+                                   else min(POLL_MAX, intervals[activity] * 2))
+            next_polls[activity] = time.monotonic() + intervals[activity]
+        # On ne prévient Zapier que si quelque chose a été synchronisé
+        if not results:
+            zap.webhook = None
+        finish_cycle(results, zap, scheduler, state, cache, sync_store, metrics, details=details)
+        stop.wait(max(0.0, min(next_polls.values()) - time.monotonic()))
+
+
+def get_detail_fetcher(args: CommandLineArguments, path: str, session: requests.Session,
+                       pool=None) -> DetailFetcher | None:
+    """
+    Retourne l'enrichissement des sorties si --enrich est demandé, avec son cache (path).
+    """
+    if not args.enrich:
+        return None
+    return DetailFetcher(DetailCache(path, trusted=args.use_cache), session, pool)
+
+
+def run_feeds(args: CommandLineArguments, zap: Zap, startup: StartupReport) -> None:
+    """
+    Mode --feed : écrit les flux iCalendar / CSV, sans credentials ni appel à l'API Google.
+    """
+    metrics: RunMetrics = RunMetrics(args.report_file, args.prom_file)
+    startup.print()
+    with requests.Session() as session:
+        details: DetailFetcher | None = get_detail_fetcher(args, args.get_path(os.path.basename(DETAIL_CACHE)), session)
+        results: dict[str, str] = export_feeds(args.activities, session,
+                                               FeedSink(args.feed_dir, args.feed_csv, metrics),
+                                               metrics, args.asvette_url, args.asvette_sortie_url, details)
+        if details is not None:
+            details.save()
+            details.shutdown()
+    zap.add(''.join(result + '\n' for result in results.values()))
+    zap.payload['metrics'] = json.dumps(metrics.export(ApiScheduler()), ensure_ascii=False)
+    if zap.webhook is not None:
+        zap.post()
+
+
+def get_anonymous_credentials():
+    """
+    Credentials d'une API de substitution (émulateur local) : pas d'authentification.
+    """
+    from google.auth.credentials import AnonymousCredentials
+    return AnonymousCredentials()
+
+
+class TenantSync:
+    """
+    Accès d'un club (--config) : credentials, service Google, caches, état local, quota d'API
+    et mesures, tous rangés dans le dossier du club.
+    """
+
+    def __init__(self, tenant: Tenant, args: CommandLineArguments, session: requests.Session,
+                 detail_pool: FairPool, names: list[str], lease: Lease):
+        self.tenant: Tenant = tenant
+        self.session: requests.Session = session
+        # Activités de la part synchronisée (--shard), et bail de leurs calendriers
+        self.names: list[str] = names
+        self.lease: Lease = lease
+        # Avec --data-dir ou des URLs de substitution, les fichiers d'état du club sont rangés à part
+        self.data_dir: str = tenant.data_dir if args.data_dir is None else os.path.join(args.data_dir, tenant.name)
+        os.makedirs(self.data_dir, exist_ok=True)
+        self.zap: Zap = Zap(tenant.webhook)
+        if args.google_api_url is None:
+            self.credentials = get_credentials(self.zap, tenant.token, tenant.credentials)
         else:
-            # On stocke l'index de la sortie dans le dataframe Google
-            google_index: int = (cal.events[cal.events['Id'] == row['Id']].index.item())
-            # Si les champs sont different, on met à jour le calendrier.
-            if diff_asvette_google(row.to_dict(), cal.events.iloc[google_index].to_dict()):
-                nb_different += 1
-                cal.update_event(event)
-            else:
-                nb_identical += 1
-    return (f"{act.name}: {nb_identical} identiques | "
-            f"{nb_different} mises à jour | {nb_absentes} créées")
+            self.credentials = get_anonymous_credentials()
+        self.service = get_service(self.credentials, args.google_api_url)
+        self.cache: PageCache | None = (PageCache(self.get_path(os.path.basename(PAGE_CACHE)))
+                                        if args.use_cache else None)
+        self.sync_store: SyncStore | None = (SyncStore(self.get_path(os.path.basename(GOOGLE_SYNC)))
+                                             if args.incremental else None)
+        self.state: StateStore = StateStore(self.get_path(os.path.basename(STATE_DB)), trusted=args.use_cache)
+        self.details: DetailFetcher | None = get_detail_fetcher(args, self.get_path(os.path.basename(DETAIL_CACHE)),
+                                                                session, detail_pool.get_queue(tenant.name))
+        # Chaque club a son propre quota d'API (ses propres credentials)
+        self.scheduler: ApiScheduler = ApiScheduler(tenant.api_rate, tenant.api_burst)
+        prom_path: str | None = None
+        if args.prom_file is not None:
+            root, extension = os.path.splitext(args.prom_file)
+            prom_path = f'{root}_{tenant.name}{extension}'
+        self.metrics: RunMetrics = RunMetrics(self.get_path(os.path.basename(RUN_REPORT)), prom_path,
+                                              tenant.name)
+
+    def get_path(self, file_name: str) -> str:
+        return os.path.join(self.data_dir, file_name)
+
+    def run(self, fetch_pool: FairPool, calendar_pool: FairPool) -> None:
+        """
+        Synchronise les activités du club sur les pools partagés, puis rend le bail.
+        """
+        tenant: Tenant = self.tenant
+        try:
+            results: dict[str, str] = sync_activities(
+                self.names, self.service, self.session, self.cache, self.sync_store, self.state,
+                self.scheduler, self.metrics, tenant.url, tenant.activities, tenant.url_sortie_base,
+                (fetch_pool.get_queue(tenant.name), calendar_pool.get_queue(tenant.name)), self.details, self.lease)
+            finish_cycle(results, self.zap, self.scheduler, self.state, self.cache, self.sync_store,
+                         self.metrics, tenant.activities, self.details)
+        finally:
+            self.state.close()
+            self.lease.release()
+
+
+def run_tenants(args: CommandLineArguments, startup: StartupReport) -> None:
+    """
+    Mode --config : synchronise tous les clubs dans un seul processus. Les téléchargements
+    ASVETTE (listes et pages des sorties) et les synchronisations de calendriers de tous les
+    clubs partagent des pools servis à tour de rôle (FairPool), ainsi que les connexions HTTP.
+    L'échec d'un club (credentials invalides, erreur de l'API...) n'interrompt pas les autres.
+    """
+    fetch_pool: FairPool = FairPool(args.workers['fetch_workers'], 'fetch')
+    calendar_pool: FairPool = FairPool(args.workers['calendar_workers'], 'calendar')
+    detail_pool: FairPool = FairPool(DETAIL_WORKERS if args.enrich else 0, 'detail')
+    hosts: set[str] = {urllib.parse.urlparse(tenant.url).netloc for tenant in args.tenants}
+
+    def run_tenant(sync: TenantSync) -> None:
+        _LOG_TENANT.name = sync.tenant.name
+        try:
+            sync.run(fetch_pool, calendar_pool)
+        except Exception as error:
+            logging.exception(f"Une erreur s'est produite: {error}")
+
+    # Une seule session (keep-alive) pour les pages ASVETTE de tous les clubs
+    with requests.Session() as session:
+        adapter = requests.adapters.HTTPAdapter(pool_connections=max(len(hosts), 1),
+                                                pool_maxsize=args.workers['fetch_workers'] + DETAIL_WORKERS)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        syncs: list[TenantSync] = []
+        # Les credentials sont lus un club après l'autre : la connexion interactive éventuelle
+        # (premier lancement) doit se faire dans le thread principal.
+        for tenant in args.tenants:
+            names: list[str] = get_shard(tenant.activities, args.shard)
+            if not names:
+                continue
+            lease: Lease = Lease(args.lease_db, [tenant.activities[name]['google_id'] for name in names])
+            if not lease.acquire():
+                logging.warning(f"[{tenant.name}] Calendriers déjà en cours de synchronisation ({lease.holder})")
+                continue
+            try:
+                syncs.append(TenantSync(tenant, args, session, detail_pool, names, lease))
+            except (Exception, SystemExit) as error:
+                lease.release()
+                logging.exception(f"[{tenant.name}] Initialisation impossible: {error!r}")
+        startup.step('tenants')
+        startup.print()
+        threads: list[threading.Thread] = [threading.Thread(target=run_tenant, args=(sync,), name=sync.tenant.name)
+                                           for sync in syncs]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    for pool in (fetch_pool, calendar_pool, detail_pool):
+        pool.shutdown()
+
+
+def run(args: CommandLineArguments, startup: StartupReport) -> None:
+    """
+    Initialise les accès (Google, caches, état local) puis lance la synchronisation,
+    unique ou en mode démon.
+    """
+    if args.tenants is not None:
+        run_tenants(args, startup)
+        return
+    zap: Zap = Zap(args.webhook)
+    if args.feed_dir is not None:
+        run_feeds(args, zap, startup)
+        return
+    if not args.activities:
+        logging.info("Aucune activité à synchroniser")
+        return
+    # Une autre exécution synchronise déjà un de ces calendriers : arrêt immédiat
+    lease: Lease = Lease(args.lease_db, [ACTIVITIES[activity]['google_id'] for activity in args.activities])
+    if not lease.acquire():
+        logging.warning(f"Calendriers déjà en cours de synchronisation ({lease.holder}), arrêt")
+        return
+    try:
+        run_sync(args, zap, startup, lease)
+    finally:
+        lease.release()
+
+
+def run_sync(args: CommandLineArguments, zap: Zap, startup: StartupReport, lease: Lease) -> None:
+    """
+    Synchronisation par l'API Google, unique ou en mode démon, une fois le bail des calendriers obtenu.
+    """
+    if args.google_api_url is None:
+        credentials = get_credentials(zap)
+    else:
+        credentials = get_anonymous_credentials()
+    startup.step('credentials')
+    service = get_service(credentials, args.google_api_url)
+    startup.step('service')
+    cache: PageCache | None = PageCache(args.get_path(os.path.basename(PAGE_CACHE))) if args.use_cache else None
+    # Le mode démon garde toujours les copies des calendriers (synchronisation incrémentale)
+    sync_store: SyncStore | None = (SyncStore(args.get_path(os.path.basename(GOOGLE_SYNC)))
+                                    if args.incremental or args.daemon else None)
+    state: StateStore = StateStore(args.get_path(os.path.basename(STATE_DB)), trusted=args.use_cache)
+    scheduler: ApiScheduler = ApiScheduler()
+    metrics: RunMetrics = RunMetrics(args.report_file, args.prom_file)
+    startup.step('state')
+    startup.print()
+    is_failed: bool = False
+    # Une seule session (keep-alive) pour toutes les pages ASVETTE
+    with requests.Session() as session:
+        details: DetailFetcher | None = get_detail_fetcher(args, args.get_path(os.path.basename(DETAIL_CACHE)), session)
+        if args.daemon:
+            run_daemon(args, credentials, service, session, cache, sync_store, state, scheduler, metrics, details,
+                       lease)
+        else:
+            results: dict[str, str] = {}
+            try:
+                results = sync_activities(args.activities, service, session, cache, sync_store, state, scheduler,
+                                          metrics, args.asvette_url, sortie_base=args.asvette_sortie_url,
+                                          details=details, lease=lease)
+            except (ListingError, LeaseLostError) as error:
+                logging.error(error)
+                zap.add(f"{error}\n")
+                is_failed = True
+            finish_cycle(results, zap, scheduler, state, cache, sync_store, metrics, details=details)
+        if details is not None:
+            details.shutdown()
+    state.close()
+    if is_failed:
+        sys.exit(1)
 
 
 @timer
 def main() -> None:
     args: CommandLineArguments = CommandLineArguments()
+    startup: StartupReport = StartupReport(args.startup_report)
     start_logging(args.log_file)
     logging.info("starting...")
-    zap: Zap = Zap(args.webhook)
-    credentials = get_credentials(zap)
-    service = get_service(credentials)
-    # On passe en revue les activités
-    for activity, value in ACTIVITIES.items():
-        # 1. Recherche des sorties pour l'activité sur le site ASVETTE
-        act = Activity(activity, value['asvette_id'], value['google_id'])
-        # Si aucune sortie ASVETTE, Alors on passe à l'activité suivante
-        if act.is_events_empty:
-            logging.info(f"Aucune sortie {act.name} trouvée")
-            continue
-        # 2. Recherche des sorties pour l'activité sur Google Calendar
-        cal: GoogleCalendar = GoogleCalendar(service, act.name, act.cal_id)
-        # On passe en revue la liste des sorties pour ajout ou mise à jour du calendrier :
-        check: str = check_events(act, cal)
-        zap.add(check + '\n')
-        logging.info(check)
-    if zap.webhook is not None:
-        zap.post()
+    startup.step('arguments')
+    if args.profile_dir is None:
+        run(args, startup)
+    else:
+        Profiler(args.profile_dir, args.profile_top, args.profile_memory).run(run, args, startup)
     logging.info("Calendar update finished normally")
 
 
+# Fin du chargement du module (--startup-report)
+MODULE_LOADED: float = time.perf_counter()
+
 if __name__ == '__main__':
-    ic.enable()
     main()
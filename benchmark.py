@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""
+Banc d'essai de asvette2google sur des données synthétiques, sans réseau.
+
+Génère des pages liste-sortie.php et des réponses events.list de Google Calendar
+de tailles configurables, avec une part réglable de sorties modifiées et nouvelles,
+puis mesure séparément chaque étape :
+- parse : analyse HTML du tableau des sorties (HTML_PARSER) ;
+- _get_rows : Activity._get_rows ;
+- _get_events : Activity._get_events (mise en forme des sorties) ;
+- _get_event_row : GoogleCalendar._get_event_row sur tous les événements Google ;
+- check_events : comparaison et plan d'écritures, envoyé à un service Google en mémoire.
+
+Pour chaque étape : meilleur temps sur plusieurs répétitions, débit (sorties/s)
+et pic de mémoire (tracemalloc, mesuré sur une exécution à part).
+Les résultats peuvent être enregistrés comme référence, puis comparés à celle-ci
+pour détecter les régressions (code de sortie 1).
+
+Exemple :
+    python3 benchmark.py --sizes 10,1000,50000 --changed 0.1 --new 0.05 --save-baseline bench.json
+    python3 benchmark.py --sizes 10,1000,50000 --baseline bench.json
+"""
+import argparse
+import html
+import json
+import random
+import sys
+import time
+import tracemalloc
+
+import asvette2google as a2g
+
+ASVETTE_ID: int = 9
+CALENDAR_ID: str = 'benchmark@group.calendar.google.com'
+STAGES: tuple[str, ...] = ('parse', '_get_rows', '_get_events', '_get_event_row', 'check_events')
+HEADERS: tuple[str, ...] = ('Id', 'Nom', 'Date', 'Heure', 'Durée', 'Difficulté', 'Encadrant', 'Lieu')
+PLACES: tuple[str, ...] = ('Chamonix', 'Saint-Hugues & Chartreuse', 'Vercors', 'Belledonne', 'Écrins')
+
+
+def make_listing(size: int, seed: int = 0) -> bytes:
+    """
+    Génère une page liste-sortie.php contenant size sorties.
+    """
+    rng: random.Random = random.Random(seed)
+    first_day: int = a2g.datetime.date.today().toordinal() + 1
+    rows: list[str] = []
+    for number in range(size):
+        day: str = a2g.datetime.date.fromordinal(first_day + rng.randrange(365)).isoformat()
+        hour: str = rng.choice(('', '', '07:30', '13:00', '18:30'))
+        duration: int = rng.choice((1, 1, 1, 2, 3))
+        values: tuple[str, ...] = (str(10000 + number), f'Sortie n°{number}', day, hour,
+                                   f'{duration} jour' + ('s' if duration > 1 else ''),
+                                   rng.choice(('F', 'PD', 'AD', 'D')), f'Encadrant {number % 37}',
+                                   rng.choice(PLACES))
+        rows.append('<tr>' + ''.join(f'<td>{html.escape(value)}</td>' for value in values) + '</tr>')
+    header: str = '<tr>' + ''.join(f'<th>{name}</th>' for name in HEADERS) + '</tr>'
+    filler: str = '<div class="menu"><ul>' + '<li><a href="#">Lien</a></li>' * 50 + '</ul></div>'
+    page: str = (f'<html><head><meta charset="utf-8"><title>Sorties</title></head><body>{filler}'
+                 f'<table id="table_sortie" class="table"><thead>{header}</thead>'
+                 f'<tbody>{"".join(rows)}</tbody></table>{filler}</body></html>')
+    return page.encode('utf-8')
+
+
+def make_google_items(sorties: list, changed: float, new: float, seed: int = 0) -> list[dict]:
+    """
+    Génère les événements Google correspondant aux sorties : une part new des sorties
+    n'existe pas encore sur Google, une part changed y a une version plus ancienne.
+    """
+    rng: random.Random = random.Random(seed)
+    items: list[dict] = []
+    for number, sortie in enumerate(sorties):
+        draw: float = rng.random()
+        if draw < new:
+            continue
+        if draw < new + changed:
+            sortie = a2g.dataclasses.replace(sortie, subject=sortie.subject + ' (ancien)')
+        event: dict = sortie.to_event()
+        event['etag'] = f'"{number}"'
+        items.append(event)
+    return items
+
+
+class StubRequest:
+
+    def __init__(self, result: dict):
+        self.result: dict = result
+        self.headers: dict[str, str] = {}
+
+    def execute(self) -> dict:
+        return self.result
+
+
+class StubBatch:
+
+    def __init__(self):
+        self.requests: list = []
+
+    def add(self, request: StubRequest, callback, request_id: str | None = None) -> None:
+        self.requests.append((request, callback, request_id))
+
+    def execute(self) -> None:
+        for number, (request, callback, request_id) in enumerate(self.requests):
+            callback(str(number) if request_id is None else request_id, request.execute(), None)
+
+
+class StubEvents:
+    """
+    Ressource events de l'API Google Calendar, en mémoire : list (pages de LIST_PAGE_SIZE
+    et champs limités au listing léger), get, insert, update, patch.
+    """
+
+    def __init__(self, items: list[dict]):
+        self.items: dict[str, dict] = {item['id']: item for item in items}
+
+    def list(self, calendarId: str, pageToken: str | None = None, maxResults: int = a2g.LIST_PAGE_SIZE,
+             fields: str = '', **params) -> StubRequest:
+        start: int = int(pageToken or 0)
+        page: list[dict] = list(self.items.values())[start:start + maxResults]
+        if 'summary' not in fields:
+            page = [{key: item[key] for key in ('id', 'etag', 'extendedProperties')} for item in page]
+        result: dict = {'items': page}
+        if start + maxResults < len(self.items):
+            result['nextPageToken'] = str(start + maxResults)
+        return StubRequest(result)
+
+    def insert(self, calendarId: str, body: dict) -> StubRequest:
+        return StubRequest(dict(body, etag='"new"'))
+
+    def update(self, calendarId: str, eventId: str, body: dict) -> StubRequest:
+        return StubRequest(dict(body, etag='"updated"'))
+
+    def get(self, calendarId: str, eventId: str) -> StubRequest:
+        return StubRequest(self.items[eventId])
+
+    def patch(self, calendarId: str, eventId: str, body: dict) -> StubRequest:
+        event: dict = dict(self.items[eventId], **{key: value for key, value in body.items()})
+        for key in ('start', 'end'):
+            event[key] = {field: value for field, value in event[key].items() if value is not None}
+        return StubRequest(dict(event, etag='"patched"'))
+
+
+class StubService:
+
+    def __init__(self, items: list[dict]):
+        self.stub_events: StubEvents = StubEvents(items)
+
+    def events(self) -> StubEvents:
+        return self.stub_events
+
+    def new_batch_http_request(self) -> StubBatch:
+        return StubBatch()
+
+
+class StubResponse:
+
+    def __init__(self, content: bytes):
+        self.content: bytes = content
+        self.status_code: int = 200
+        self.headers: dict[str, str] = {}
+
+
+class StubSession:
+    """
+    Session HTTP renvoyant toujours la même page ASVETTE.
+    """
+
+    def __init__(self, content: bytes):
+        self.content: bytes = content
+
+    def get(self, url: str, headers: dict | None = None) -> StubResponse:
+        return StubResponse(self.content)
+
+
+def get_calendars(act: a2g.Activity, items: list[dict]) -> a2g.CalendarRegistry:
+    """
+    Retourne les calendriers Google en mémoire, celui de l'activité étant déjà listé (items).
+    """
+    # Pas de limite de débit : seul le coût du code est mesuré
+    scheduler: a2g.ApiScheduler = a2g.ApiScheduler(rate=1e9, burst=10 ** 9)
+    registry: a2g.CalendarRegistry = a2g.CalendarRegistry(StubService(items), [act], scheduler=scheduler)
+    registry.get(act.cal_id)
+    return registry
+
+
+def get_stages(size: int, changed: float, new: float) -> dict:
+    """
+    Prépare les données d'une taille et retourne, par étape, la fonction à mesurer.
+    Chaque fonction est appelée sur des données fraîches (préparées hors mesure).
+    """
+    content: bytes = make_listing(size)
+    parser = a2g.HTML_PARSERS[a2g.HTML_PARSER]
+    act: a2g.Activity = a2g.Activity('Benchmark', ASVETTE_ID, CALENDAR_ID, session=StubSession(content))
+    items: list[dict] = make_google_items(act.events, changed, new)
+
+    def check_events():
+        registry: a2g.CalendarRegistry = get_calendars(act, items)
+        return lambda: a2g.check_events(act, registry)
+
+    return {
+        'parse': lambda: (lambda: parser(content)),
+        '_get_rows': lambda: (lambda: a2g.Activity._get_rows(act.table)),
+        '_get_events': lambda: act._get_events,
+        '_get_event_row': lambda: (lambda: [a2g.GoogleCalendar._get_event_row(item) for item in items]),
+        'check_events': check_events,
+    }
+
+
+def measure(prepare, repeat: int) -> tuple[float, int]:
+    """
+    Retourne le meilleur temps sur repeat exécutions et le pic de mémoire d'une exécution.
+    """
+    best: float = float('inf')
+    for _ in range(repeat):
+        func = prepare()
+        start: float = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    func = prepare()
+    tracemalloc.start()
+    func()
+    peak: int = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best, peak
+
+
+def run(sizes: list[int], changed: float, new: float, repeat: int) -> dict[str, dict[str, dict]]:
+    """
+    :return: {taille: {étape: {'seconds', 'throughput', 'peak_kib'}}}
+    """
+    results: dict[str, dict[str, dict]] = {}
+    for size in sizes:
+        stages: dict = get_stages(size, changed, new)
+        results[str(size)] = {}
+        for stage in STAGES:
+            seconds, peak = measure(stages[stage], repeat)
+            results[str(size)][stage] = {'seconds': round(seconds, 6),
+                                         'throughput': round(size / seconds) if seconds else None,
+                                         'peak_kib': round(peak / 1024)}
+            print(f"{size:>7} {stage:<15} {seconds * 1000:10.2f} ms "
+                  f"{results[str(size)][stage]['throughput'] or 0:>12} sorties/s {peak / 1024:10.0f} Kio")
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """
+    Compare les temps à la référence.
+    :return: Les régressions (temps supérieur à la référence de plus de tolerance)
+    """
+    regressions: list[str] = []
+    for size, stages in results.items():
+        for stage, result in stages.items():
+            reference: dict | None = baseline.get(size, {}).get(stage)
+            if reference is None:
+                continue
+            ratio: float = result['seconds'] / reference['seconds'] if reference['seconds'] else 1.0
+            if ratio > 1 + tolerance:
+                regressions.append(f"{size} {stage}: {result['seconds'] * 1000:.2f} ms au lieu de "
+                                   f"{reference['seconds'] * 1000:.2f} ms (x{ratio:.2f})")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Banc d'essai de asvette2google sur des données synthétiques.")
+    parser.add_argument('--sizes', type=str, default='10,100,1000,10000,50000',
+                        help="Nombres de sorties, séparés par des virgules (défaut : 10,100,1000,10000,50000)")
+    parser.add_argument('--changed', type=float, default=0.1,
+                        help="Part des sorties modifiées depuis la dernière synchronisation (défaut : 0.1)")
+    parser.add_argument('--new', type=float, default=0.05,
+                        help="Part des sorties absentes du calendrier Google (défaut : 0.05)")
+    parser.add_argument('--repeat', type=int, default=3, help="Nombre de répétitions (défaut : 3)")
+    parser.add_argument('--save-baseline', type=str, default=None,
+                        help="Enregistre les résultats comme référence.")
+    parser.add_argument('--baseline', type=str, default=None, help="Compare les résultats à cette référence.")
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help="Ralentissement toléré par rapport à la référence (défaut : 0.25)")
+    arguments = parser.parse_args()
+    sizes: list[int] = [int(size) for size in arguments.sizes.split(',')]
+    print(f"Parseur HTML : {a2g.HTML_PARSER}")
+    results: dict = run(sizes, arguments.changed, arguments.new, arguments.repeat)
+    if arguments.save_baseline is not None:
+        with open(arguments.save_baseline, 'w') as baseline_file:
+            json.dump(results, baseline_file, indent=2)
+    if arguments.baseline is not None:
+        with open(arguments.baseline) as baseline_file:
+            regressions: list[str] = compare(results, json.load(baseline_file), arguments.tolerance)
+        for regression in regressions:
+            print(f"RÉGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
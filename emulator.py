@@ -0,0 +1,471 @@
+#!/usr/bin/env python3
+"""
+Émulateur local d'ASVETTE et de l'API Google Calendar v3, pour les tests de charge hors ligne.
+
+Un seul serveur HTTP sert :
+- les pages liste-sortie.php?Activite=N, lues dans un dossier de fixtures (N.html),
+  ou générées (benchmark.make_listing) si la fixture n'existe pas, avec ETag / Last-Modified ;
+- les pages info-sortie.php?id=N (--enrich), lues dans le dossier de fixtures (sortie-N.html)
+  ou générées ;
+- l'API Calendar v3, en mémoire : events list (pages, syncToken), get, insert, update,
+  patch (If-Match) et les lots (/batch/calendar/v3).
+
+Des pannes peuvent être injectées : latence, 409, 412, 410 (jeton de synchronisation),
+429, 5xx et quota de requêtes par seconde (403 rateLimitExceeded).
+Les requêtes de l'API peuvent être enregistrées (--record, JSON lines), et une session
+enregistrée peut être rejouée au démarrage (--replay) pour retrouver l'état des calendriers.
+
+Exemple :
+    python3 emulator.py --port 8765 --sorties 2000 --latency 0.05 --throttle-rate 0.02 --quota 50
+    python3 asvette2google.py --no-cache \\
+        --asvette-url 'http://127.0.0.1:8765/public/pages/liste-sortie.php?Activite=' \\
+        --google-api-url http://127.0.0.1:8765/ \\
+        --enrich --asvette-sortie-url 'http://127.0.0.1:8765/public/pages/info-sortie.php?id='
+"""
+import argparse
+import email.parser
+import html
+import email.utils
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from benchmark import make_listing
+
+API_PREFIX: str = '/calendar/v3/calendars/'
+BATCH_PATH: str = '/batch/calendar/v3'
+REASONS: dict[int, str] = {200: 'OK', 204: 'No Content', 304: 'Not Modified', 400: 'Bad Request',
+                           403: 'Forbidden', 404: 'Not Found', 409: 'Conflict', 410: 'Gone',
+                           412: 'Precondition Failed', 429: 'Too Many Requests', 500: 'Internal Server Error',
+                           503: 'Service Unavailable'}
+
+
+def get_error(status: int, message: str, reason: str) -> dict:
+    """
+    Retourne le corps d'une erreur au format de l'API Google.
+    """
+    return {'error': {'code': status, 'message': message,
+                      'errors': [{'domain': 'global', 'reason': reason, 'message': message}]}}
+
+
+class Faults:
+    """
+    Pannes injectées dans les réponses de l'API et d'ASVETTE.
+    Les taux sont des probabilités par requête (ou sous-requête d'un lot).
+    """
+
+    def __init__(self, latency: float = 0.0, error_rate: float = 0.0, throttle_rate: float = 0.0,
+                 conflict_rate: float = 0.0, precondition_rate: float = 0.0, gone_rate: float = 0.0,
+                 quota: int = 0, seed: int | None = None):
+        self.latency: float = latency
+        self.error_rate: float = error_rate
+        self.throttle_rate: float = throttle_rate
+        self.conflict_rate: float = conflict_rate
+        self.precondition_rate: float = precondition_rate
+        self.gone_rate: float = gone_rate
+        # Nombre maximal de requêtes par seconde (0 = pas de limite)
+        self.quota: int = quota
+        self.lock: threading.Lock = threading.Lock()
+        self.random: random.Random = random.Random(seed)
+        self.second: int = 0
+        self.nb_requests: int = 0
+
+    def draw(self, rate: float) -> bool:
+        with self.lock:
+            return self.random.random() < rate
+
+    def sleep(self) -> None:
+        if self.latency:
+            time.sleep(self.latency)
+
+    def check(self, action: str) -> tuple[int, dict] | None:
+        """
+        Retourne l'erreur injectée pour cette requête, ou None.
+        """
+        with self.lock:
+            now: int = int(time.monotonic())
+            if now != self.second:
+                self.second, self.nb_requests = now, 0
+            self.nb_requests += 1
+            over_quota: bool = bool(self.quota) and self.nb_requests > self.quota
+        if over_quota:
+            return 403, get_error(403, 'Rate Limit Exceeded', 'rateLimitExceeded')
+        if self.draw(self.throttle_rate):
+            return 429, get_error(429, 'Too Many Requests', 'rateLimitExceeded')
+        if self.draw(self.error_rate):
+            return 503, get_error(503, 'Backend Error', 'backendError')
+        if action == 'insert' and self.draw(self.conflict_rate):
+            return 409, get_error(409, 'The requested identifier already exists.', 'duplicate')
+        if action == 'patch' and self.draw(self.precondition_rate):
+            return 412, get_error(412, 'Precondition Failed', 'conditionNotMet')
+        if action == 'sync' and self.draw(self.gone_rate):
+            return 410, get_error(410, 'Sync token is no longer valid, a full sync is required.',
+                                  'fullSyncRequired')
+        return None
+
+
+class CalendarStore:
+    """
+    Calendriers Google en mémoire. Chaque écriture reçoit un numéro de séquence,
+    qui sert d'etag et de jeton de synchronisation. Partagé entre les threads.
+    """
+
+    def __init__(self):
+        self.lock: threading.Lock = threading.Lock()
+        self.sequence: int = 0
+        # {calendarId: {eventId: (séquence, événement)}}
+        self.calendars: dict[str, dict[str, tuple[int, dict]]] = {}
+
+    def _write(self, calendar_id: str, event: dict) -> dict:
+        self.sequence += 1
+        event = dict(event, etag=f'"{self.sequence}"', status=event.get('status', 'confirmed'),
+                     updated=time.strftime('%Y-%m-%dT%H:%M:%S.000Z', time.gmtime()))
+        for key in ('start', 'end'):
+            if isinstance(event.get(key), dict):
+                event[key] = {field: value for field, value in event[key].items() if value is not None}
+        self.calendars.setdefault(calendar_id, {})[event['id']] = (self.sequence, event)
+        return event
+
+    def list(self, calendar_id: str, params: dict[str, str]) -> tuple[int, dict]:
+        """
+        events.list : pages de maxResults événements, bornées par timeMin/timeMax, ou
+        changements depuis un syncToken (y compris les événements annulés).
+        """
+        with self.lock:
+            events: list[tuple[int, dict]] = list(self.calendars.get(calendar_id, {}).values())
+            sequence: int = self.sequence
+        if 'syncToken' in params:
+            if not params['syncToken'].isdigit() or int(params['syncToken']) > sequence:
+                return 410, get_error(410, 'Sync token is no longer valid, a full sync is required.',
+                                      'fullSyncRequired')
+            items: list[dict] = [event for number, event in events if number > int(params['syncToken'])]
+        else:
+            items = [event for _, event in events if event['status'] != 'cancelled']
+            if 'timeMin' in params:
+                items = [event for event in items if self._get_end(event) >= params['timeMin'][:10]]
+            if 'timeMax' in params:
+                items = [event for event in items if self._get_start(event) < params['timeMax'][:10]]
+            items.sort(key=self._get_start)
+        start: int = int(params.get('pageToken') or 0)
+        size: int = int(params.get('maxResults') or 250)
+        result: dict = {'kind': 'calendar#events', 'items': items[start:start + size]}
+        if start + size < len(items):
+            result['nextPageToken'] = str(start + size)
+        else:
+            result['nextSyncToken'] = str(sequence)
+        return 200, result
+
+    @staticmethod
+    def _get_start(event: dict) -> str:
+        return event['start'].get('dateTime', event['start'].get('date', ''))[:10]
+
+    @staticmethod
+    def _get_end(event: dict) -> str:
+        return event['end'].get('dateTime', event['end'].get('date', ''))[:10]
+
+    def get(self, calendar_id: str, event_id: str) -> tuple[int, dict]:
+        with self.lock:
+            entry: tuple[int, dict] | None = self.calendars.get(calendar_id, {}).get(event_id)
+        if entry is None:
+            return 404, get_error(404, 'Not Found', 'notFound')
+        return 200, entry[1]
+
+    def insert(self, calendar_id: str, body: dict) -> tuple[int, dict]:
+        with self.lock:
+            if body.get('id') in self.calendars.get(calendar_id, {}):
+                return 409, get_error(409, 'The requested identifier already exists.', 'duplicate')
+            body = dict(body)
+            body.setdefault('id', f'emulator{self.sequence + 1}')
+            return 200, self._write(calendar_id, body)
+
+    def update(self, calendar_id: str, event_id: str, body: dict) -> tuple[int, dict]:
+        with self.lock:
+            if event_id not in self.calendars.get(calendar_id, {}):
+                return 404, get_error(404, 'Not Found', 'notFound')
+            return 200, self._write(calendar_id, dict(body, id=event_id))
+
+    def patch(self, calendar_id: str, event_id: str, body: dict, if_match: str | None) -> tuple[int, dict]:
+        with self.lock:
+            entry: tuple[int, dict] | None = self.calendars.get(calendar_id, {}).get(event_id)
+            if entry is None:
+                return 404, get_error(404, 'Not Found', 'notFound')
+            if if_match is not None and if_match != entry[1]['etag']:
+                return 412, get_error(412, 'Precondition Failed', 'conditionNotMet')
+            event: dict = dict(entry[1])
+            for key, value in body.items():
+                if isinstance(value, dict) and isinstance(event.get(key), dict) and key not in ('start', 'end'):
+                    event[key] = dict(event[key], **value)
+                else:
+                    event[key] = value
+            return 200, self._write(calendar_id, event)
+
+
+class Emulator:
+    """
+    Traitement des requêtes de l'API Calendar (directes, ou sous-requêtes d'un lot),
+    avec injection de pannes et enregistrement de la session.
+    """
+
+    def __init__(self, store: CalendarStore, faults: Faults, record: str | None = None):
+        self.store: CalendarStore = store
+        self.faults: Faults = faults
+        self.record_lock: threading.Lock = threading.Lock()
+        self.record_file = None if record is None else open(record, 'a')
+
+    @staticmethod
+    def _get_action(method: str, parts: list[str], params: dict[str, str]) -> str | None:
+        if len(parts) == 2 and parts[1] == 'events':
+            if method == 'GET':
+                return 'sync' if 'syncToken' in params else 'list'
+            return 'insert' if method == 'POST' else None
+        if len(parts) == 3 and parts[1] == 'events':
+            return {'GET': 'get', 'PUT': 'update', 'PATCH': 'patch'}.get(method)
+        return None
+
+    def handle(self, method: str, target: str, headers: dict[str, str], body: bytes,
+               faults: bool = True) -> tuple[int, dict]:
+        """
+        Traite une requête de l'API Calendar.
+        :param target: Chemin et paramètres de la requête (/calendar/v3/calendars/...)
+        :param faults: Faux pour rejouer une session sans injecter de pannes
+        :return: (statut HTTP, corps JSON)
+        """
+        url: urllib.parse.SplitResult = urllib.parse.urlsplit(target)
+        params: dict[str, str] = dict(urllib.parse.parse_qsl(url.query))
+        parts: list[str] = [urllib.parse.unquote(part) for part in url.path[len(API_PREFIX):].split('/')]
+        action: str | None = self._get_action(method, parts, params) if url.path.startswith(API_PREFIX) else None
+        if action is None:
+            return 404, get_error(404, 'Not Found', 'notFound')
+        error: tuple[int, dict] | None = self.faults.check(action) if faults else None
+        if error is not None:
+            status, result = error
+        else:
+            payload: dict = json.loads(body) if body else {}
+            if action in ('list', 'sync'):
+                status, result = self.store.list(parts[0], params)
+            elif action == 'get':
+                status, result = self.store.get(parts[0], parts[2])
+            elif action == 'insert':
+                status, result = self.store.insert(parts[0], payload)
+            elif action == 'update':
+                status, result = self.store.update(parts[0], parts[2], payload)
+            else:
+                if_match: str | None = next((value for key, value in headers.items() if key.lower() == 'if-match'),
+                                            None)
+                status, result = self.store.patch(parts[0], parts[2], payload, if_match)
+        if self.record_file is not None and faults:
+            with self.record_lock:
+                self.record_file.write(json.dumps({'method': method, 'target': target,
+                                                   'headers': headers, 'body': body.decode('utf-8'),
+                                                   'status': status}) + '\n')
+                self.record_file.flush()
+        return status, result
+
+    def handle_batch(self, content_type: str, body: bytes) -> tuple[str, bytes]:
+        """
+        Traite un lot (multipart/mixed) : chaque sous-requête est une requête HTTP complète.
+        :return: (Content-Type, corps multipart/mixed de la réponse)
+        """
+        message = email.parser.BytesParser().parsebytes(
+            f'Content-Type: {content_type}\r\n\r\n'.encode() + body)
+        boundary: str = 'batch_emulator_' + hashlib.sha1(body).hexdigest()[:16]
+        chunks: list[str] = []
+        for part in message.get_payload():
+            request: str = part.get_payload()
+            head, _, sub_body = request.replace('\r\n', '\n').partition('\n\n')
+            request_line, *header_lines = head.split('\n')
+            method, target = request_line.split(' ')[:2]
+            headers: dict[str, str] = dict(line.split(': ', 1) for line in header_lines if ': ' in line)
+            url: urllib.parse.SplitResult = urllib.parse.urlsplit(target)
+            status, result = self.handle(method, url.path + ('?' + url.query if url.query else ''),
+                                         headers, sub_body.encode('utf-8'))
+            content_id: str = part.get('Content-ID', '<>')
+            chunks.append(f'--{boundary}\r\nContent-Type: application/http\r\n'
+                          f'Content-ID: <response-{content_id[1:-1]}>\r\n\r\n'
+                          f'HTTP/1.1 {status} {REASONS.get(status, "Error")}\r\n'
+                          f'Content-Type: application/json; charset=UTF-8\r\n\r\n{json.dumps(result)}\r\n')
+        return f'multipart/mixed; boundary={boundary}', (''.join(chunks) + f'--{boundary}--\r\n').encode('utf-8')
+
+    def replay(self, path: str) -> int:
+        """
+        Rejoue les écritures réussies d'une session enregistrée, sans pannes.
+        :return: Le nombre de requêtes rejouées
+        """
+        nb_replayed: int = 0
+        with open(path) as session_file:
+            for line in session_file:
+                request: dict = json.loads(line)
+                if request['status'] == 200 and request['method'] in ('POST', 'PUT', 'PATCH'):
+                    self.handle(request['method'], request['target'], request['headers'],
+                                request['body'].encode('utf-8'), faults=False)
+                    nb_replayed += 1
+        return nb_replayed
+
+
+class Asvette:
+    """
+    Pages liste-sortie.php : fixture N.html du dossier fixtures si elle existe,
+    sinon page générée de sorties sorties (une graine par activité).
+    """
+
+    def __init__(self, fixtures: str | None, sorties: int):
+        self.fixtures: str | None = fixtures
+        self.sorties: int = sorties
+        self.generated: dict[str, bytes] = {}
+        self.lock: threading.Lock = threading.Lock()
+
+    def get_page(self, activity: str) -> tuple[bytes, float]:
+        """
+        :return: (contenu de la page, date de modification)
+        """
+        if self.fixtures is not None:
+            path: str = os.path.join(self.fixtures, f'{activity}.html')
+            if os.path.exists(path):
+                with open(path, 'rb') as fixture:
+                    return fixture.read(), os.path.getmtime(path)
+        with self.lock:
+            if activity not in self.generated:
+                seed: int = int(activity) if activity.isdigit() else 0
+                self.generated[activity] = make_listing(self.sorties, seed=seed)
+        return self.generated[activity], 0.0
+
+    def get_detail(self, sortie_id: str) -> bytes:
+        """
+        Page info-sortie.php : fixture sortie-N.html, sinon page générée à partir de l'id.
+        """
+        if self.fixtures is not None:
+            path: str = os.path.join(self.fixtures, f'sortie-{os.path.basename(sortie_id)}.html')
+            if os.path.exists(path):
+                with open(path, 'rb') as fixture:
+                    return fixture.read()
+        rng: random.Random = random.Random(sortie_id)
+        rows: list[tuple[str, str]] = [
+            ('Lieu de rendez-vous', rng.choice(('Parking du gymnase', 'Gare de Grenoble', 'Col de Porte'))),
+            ('Heure de départ', rng.choice(('6h30', '7h00', '13h30'))),
+            ('Heure de retour', rng.choice(('17h00', '18h30', '20h00'))),
+            ('Places restantes', str(rng.randrange(12))),
+            ('Inscriptions', rng.choice(('Ouvertes', 'Fermées', 'Liste d\'attente'))),
+        ]
+        table: str = ''.join(f'<tr><th>{label}</th><td>{html.escape(value)}</td></tr>' for label, value in rows)
+        return (f'<html><head><meta charset="utf-8"><title>Sortie {html.escape(sortie_id)}</title></head>'
+                f'<body><table class="table">{table}</table></body></html>').encode('utf-8')
+
+
+def get_handler(emulator: Emulator, asvette: Asvette) -> type[BaseHTTPRequestHandler]:
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version: str = 'HTTP/1.1'
+
+        def log_message(self, format: str, *args) -> None:
+            pass
+
+        def _send(self, status: int, content: bytes, content_type: str, headers: dict[str, str] | None = None):
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(content)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(content)
+
+        def _read_body(self) -> bytes:
+            return self.rfile.read(int(self.headers.get('Content-Length') or 0))
+
+        def _handle_api(self) -> None:
+            body: bytes = self._read_body()
+            emulator.faults.sleep()
+            if urllib.parse.urlsplit(self.path).path == BATCH_PATH:
+                content_type, content = emulator.handle_batch(self.headers['Content-Type'], body)
+                self._send(200, content, content_type)
+                return
+            status, result = emulator.handle(self.command, self.path, dict(self.headers.items()), body)
+            self._send(status, json.dumps(result).encode('utf-8'), 'application/json; charset=UTF-8')
+
+        def _handle_asvette(self) -> None:
+            url: urllib.parse.SplitResult = urllib.parse.urlsplit(self.path)
+            if url.path.endswith('info-sortie.php'):
+                emulator.faults.sleep()
+                sortie_id: str = dict(urllib.parse.parse_qsl(url.query)).get('id', '0')
+                self._send(200, asvette.get_detail(sortie_id), 'text/html; charset=utf-8')
+                return
+            if not url.path.endswith('liste-sortie.php'):
+                self._send(404, b'Not Found', 'text/plain')
+                return
+            emulator.faults.sleep()
+            activity: str = dict(urllib.parse.parse_qsl(url.query)).get('Activite', '0')
+            content, modified = asvette.get_page(activity)
+            etag: str = '"' + hashlib.sha256(content).hexdigest()[:32] + '"'
+            headers: dict[str, str] = {'ETag': etag}
+            if modified:
+                headers['Last-Modified'] = email.utils.formatdate(modified, usegmt=True)
+            if self.headers.get('If-None-Match') == etag:
+                self._send(304, b'', 'text/html; charset=utf-8', headers)
+                return
+            self._send(200, content, 'text/html; charset=utf-8', headers)
+
+        def do_GET(self) -> None:
+            if self.path.startswith(API_PREFIX):
+                self._handle_api()
+            else:
+                self._handle_asvette()
+
+        def do_POST(self) -> None:
+            self._handle_api()
+
+        def do_PUT(self) -> None:
+            self._handle_api()
+
+        def do_PATCH(self) -> None:
+            self._handle_api()
+
+    return Handler
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Émulateur local d'ASVETTE et de l'API Google Calendar v3.")
+    parser.add_argument('--host', type=str, default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--fixtures', type=str, default=None,
+                        help="Dossier des pages ASVETTE (<id activité>.html). Sinon, pages générées.")
+    parser.add_argument('--sorties', type=int, default=200,
+                        help="Nombre de sorties des pages générées (défaut : 200)")
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help="Latence ajoutée à chaque requête (secondes)")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Taux d'erreurs 503")
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help="Taux d'erreurs 429")
+    parser.add_argument('--conflict-rate', type=float, default=0.0, help="Taux d'erreurs 409 sur les ajouts")
+    parser.add_argument('--precondition-rate', type=float, default=0.0, help="Taux d'erreurs 412 sur les PATCH")
+    parser.add_argument('--gone-rate', type=float, default=0.0,
+                        help="Taux d'erreurs 410 sur les listings incrémentaux (syncToken)")
+    parser.add_argument('--quota', type=int, default=0,
+                        help="Requêtes par seconde au-delà desquelles l'API répond 403 rateLimitExceeded")
+    parser.add_argument('--seed', type=int, default=None, help="Graine des pannes aléatoires")
+    parser.add_argument('--record', type=str, default=None, help="Enregistre les requêtes de l'API (JSON lines)")
+    parser.add_argument('--replay', type=str, default=None,
+                        help="Rejoue au démarrage les écritures d'une session enregistrée")
+    arguments = parser.parse_args()
+    faults: Faults = Faults(arguments.latency, arguments.error_rate, arguments.throttle_rate,
+                            arguments.conflict_rate, arguments.precondition_rate, arguments.gone_rate,
+                            arguments.quota, arguments.seed)
+    emulator: Emulator = Emulator(CalendarStore(), faults, arguments.record)
+    if arguments.replay is not None:
+        print(f"{emulator.replay(arguments.replay)} écritures rejouées depuis {arguments.replay}")
+    server: ThreadingHTTPServer = ThreadingHTTPServer((arguments.host, arguments.port),
+                                                      get_handler(emulator, Asvette(arguments.fixtures,
+                                                                                    arguments.sorties)))
+    print(f"Émulateur à l'écoute sur http://{arguments.host}:{arguments.port}/")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()